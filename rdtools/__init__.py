@@ -1,11 +1,27 @@
 from rdtools.normalization import normalize_with_sapm
+from rdtools.normalization import normalize_with_sapm_chunked
+from rdtools.normalization import normalize_with_sapm_fleet
+from rdtools.normalization import sapm_dc_power_fleet
 from rdtools.normalization import normalize_with_pvwatts
+from rdtools.normalization import normalize_with_pvwatts_chunked
+from rdtools.normalization import normalize_with_pvwatts_arrays
 from rdtools.normalization import irradiance_rescale
+from rdtools.normalization import irradiance_rescale_fleet
+from rdtools.normalization import ResampleMapping
+from rdtools.normalization import set_frequency_cache
+from rdtools.normalization import set_solar_position_cache
 from rdtools.degradation import degradation_ols
+from rdtools.degradation import degradation_ols_fleet
+from rdtools.degradation import OLSAccumulator
 from rdtools.degradation import degradation_classical_decomposition
 from rdtools.degradation import degradation_year_on_year
+from rdtools.degradation import degradation_year_on_year_fleet
+from rdtools.degradation import YoYAccumulator
 from rdtools.aggregation import aggregation_insol
 from rdtools.clearsky_temperature import get_clearsky_tamb
+from rdtools.clearsky_temperature import get_clearsky_tamb_fleet
+from rdtools.clearsky_temperature import close_temperature_dataset
+from rdtools.clearsky_temperature import set_clearsky_tamb_cache
 from rdtools.filtering import csi_filter
 from rdtools.filtering import poa_filter
 from rdtools.filtering import tcell_filter
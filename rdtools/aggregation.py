@@ -2,7 +2,7 @@
 Aggregation Helper Functions
 '''
 
-def aggregation_insol(normalized_energy, insolation, frequency='D'):
+def aggregation_insol(normalized_energy, insolation, frequency='D', dtype=None):
     '''
     Insolation weighted aggregation
 
@@ -14,12 +14,19 @@ def aggregation_insol(normalized_energy, insolation, frequency='D'):
         Time series of insolation associated with each normalize_energy point
     frequency: Pandas offset string
         Target frequency at which to aggregate
+    dtype: numpy float dtype, default None
+        Floating point type to compute and return the aggregate in, e.g.
+        np.float32. The resampled sums are accumulated in dtype by pandas.
 
     Returns
     -------
     aggregated: Pandas Series (numeric)
         Insolation weighted average, aggregated at frequency
     '''
+    if dtype is not None:
+        insolation = insolation.astype(dtype, copy=False)
+        normalized_energy = normalized_energy.astype(dtype, copy=False)
+
     aggregated = (insolation * normalized_energy).resample(frequency).sum() / insolation.resample(frequency).sum()
 
     return aggregated
@@ -1,10 +1,131 @@
-import h5py
-from numpy import arange
 from datetime import timedelta
 import pandas as pd
 import pkg_resources
 import numpy as np
-import warnings
+import threading
+from collections import OrderedDict
+
+
+# Smoothed daily temperatures of grid pixels, see set_clearsky_tamb_cache
+_climatology_cache = OrderedDict()
+_climatology_cache_size = 256
+_climatology_cache_lock = threading.Lock()
+
+# Zero-based month of each day of a common and a leap year
+_YEAR_MONTHS = tuple(pd.date_range(start, periods=days, freq='D').month.values - 1
+                     for start, days in (('2001-01-01', 365), ('2000-01-01', 366)))
+
+
+class _TemperatureDataset(object):
+    '''
+    Gap-filled day and night clear sky temperature grids built from
+    data/temperature.hdf5 by _build_temperature_grids, read once into memory
+    on first use and shared by all calls and threads until closed
+    '''
+
+    def __init__(self, resource='data/temperature_filled.npz'):
+        self.resource = resource
+        self._grids = None
+        self._lock = threading.Lock()
+
+    def grids(self):
+        '''Returns the (day, night) grids as read-only arrays, loading them if needed'''
+        grids = self._grids
+        if grids is None:
+            with self._lock:
+                if self._grids is None:
+                    self._grids = self._load()
+                grids = self._grids
+        return grids
+
+    def close(self):
+        '''Releases the grids, which are loaded again on next use'''
+        with self._lock:
+            self._grids = None
+
+    def _load(self):
+        filepath = pkg_resources.resource_filename('rdtools', self.resource)
+        with np.load(filepath) as f:
+            grids = tuple(np.ascontiguousarray(f[name]) for name in ('day', 'night'))
+        for grid in grids:
+            grid.flags.writeable = False
+        return grids
+
+
+_dataset = _TemperatureDataset()
+
+
+def close_temperature_dataset():
+    '''
+    Description
+    -----------
+    Releases the clear sky temperature grids and the cached smoothed daily
+    temperatures held in memory by get_clearsky_tamb. They are read from the
+    package data again on the next call.
+    '''
+    _dataset.close()
+    with _climatology_cache_lock:
+        _climatology_cache.clear()
+
+
+def set_clearsky_tamb_cache(maxsize=256):
+    '''
+    Description
+    -----------
+    Sets the number of sites whose smoothed daily day and night temperatures
+    are kept by get_clearsky_tamb and get_clearsky_tamb_fleet, least recently
+    used first out. Later calls for a site on the same grid pixel with the same
+    window_size and gauss_std skip the smoothing for any times.
+
+    Parameters
+    ----------
+    maxsize:     int, maximum number of cached sites, default 256.
+                 0 or None disables and clears the cache.
+    '''
+
+    global _climatology_cache_size
+
+    with _climatology_cache_lock:
+        _climatology_cache_size = maxsize or 0
+        while len(_climatology_cache) > _climatology_cache_size:
+            _climatology_cache.popitem(last=False)
+
+
+def _build_temperature_grids(source='data/temperature.hdf5',
+                             destination='data/temperature_filled.npz'):
+    '''
+    Builds the grids read by get_clearsky_tamb from the MODIS climatology in
+    source, with the pixels missing data (oceans and coasts) filled from the
+    nearest pixel with data in the same month, and saves them compressed to
+    destination. Run with python -m rdtools.clearsky_temperature when the
+    source data changes.
+    '''
+    import h5py
+
+    source = pkg_resources.resource_filename('rdtools', source)
+    destination = pkg_resources.resource_filename('rdtools', destination)
+    with h5py.File(source, 'r') as f:
+        grids = dict((name, _fill_missing(f['temperature'][name][()]))
+                     for name in ('day', 'night'))
+    np.savez_compressed(destination, **grids)
+
+
+def _fill_missing(grid):
+    '''
+    Fills the NaN pixels of each month of a (longitude, latitude, month) grid
+    with the nearest valid pixel, wrapping around in longitude
+    '''
+    from scipy import ndimage
+
+    lons = grid.shape[0]
+    tiled = np.concatenate([grid, grid, grid], axis=0)
+    filled = np.empty_like(grid)
+    for k in range(grid.shape[2]):
+        x, y = ndimage.distance_transform_edt(np.isnan(tiled[:, :, k]), return_distances=False,
+                                              return_indices=True)
+        filled[:, :, k] = tiled[x, y, k][lons:2 * lons]
+    return filled
+
 
 def get_clearsky_tamb(times, latitude, longitude, window_size=40, gauss_std=20):
     '''
@@ -30,97 +151,170 @@ def get_clearsky_tamb(times, latitude, longitude, window_size=40, gauss_std=20):
     https://neo.sci.gsfc.nasa.gov/view.php?datasetId=MOD_LSTN_CLIM_M
     '''
 
-    filepath = pkg_resources.resource_filename('rdtools', 'data/temperature.hdf5')
+    lon_index, lat_index = _grid_indices([latitude], [longitude], _dataset.grids()[0].shape)
+    climatologies = _climatologies(lon_index, lat_index, window_size, gauss_std)
+    temperature = _clearsky_tamb_sites(times, np.array([longitude], dtype=float), climatologies)
 
-    buffer = timedelta(days=window_size)
+    return pd.Series(temperature[:, 0], index=times, name='Clear Sky Temperature (C)')
 
-    if times.freq is None:
-        freq_actual = pd.infer_freq(times)
-        if freq_actual is None:
-            freq_actual = pd.infer_freq(times[:10])
-            warnings.warn("Input 'times' has no frequency attribute. Inferring frequency from first 10 timestamps.")
-    else:
-        freq_actual = times.freq
 
-    dt_daily = pd.date_range(times.date[0] - buffer, times.date[-1] + buffer, freq='D', tz=times.tz)
+def get_clearsky_tamb_fleet(times, latitudes, longitudes, timezones=None, window_size=40,
+                            gauss_std=20):
+    '''
+    Description
+    -----------
+    Estimates the ambient temperature at many sites for the given times, as
+    get_clearsky_tamb with the grid lookup and smoothing vectorized across sites
 
-    f = h5py.File(filepath, "r")
+    Parameters
+    ----------
+    times:       DateTimeIndex in local time, or in any time zone if timezones is given
+    latitudes:   array of float degrees
+    longitudes:  array of float degrees
+    timezones:   list of the time zones of the sites, times.tz for all sites if omitted.
+                 Each site is calculated with times converted to its time zone.
 
-    a = f['temperature']['day']
-    b = f['temperature']['night']
+    Returns
+    -------
+    pandas DataFrame of clear sky ambient temperature indexed by times, with a
+    column for each site in order
 
-    lons = len(a[:, 0, 0])
-    lats = len(a[0, :, 0])
+    Reference
+    ---------
+    See get_clearsky_tamb
+    '''
 
-    lon_temp = longitude - 180
-    if lon_temp < 0:
-        lon_temp += 360
-    lon_index = round(float(lons) * float(lon_temp) / 360.0)
-    lat_index = round(float(lats) * (90.0 - float(latitude)) / 180.0)
+    latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+    longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+    if latitudes.shape != longitudes.shape:
+        raise ValueError('latitudes and longitudes must have the same length')
+    if timezones is None:
+        timezones = [times.tz] * len(latitudes)
+    elif len(timezones) != len(latitudes):
+        raise ValueError('timezones must have the same length as latitudes')
 
-    df = pd.DataFrame(index=dt_daily)
-    df['month'] = df.index.month
+    lon_index, lat_index = _grid_indices(latitudes, longitudes, _dataset.grids()[0].shape)
+    climatologies = _climatologies(lon_index, lat_index, window_size, gauss_std)
 
-    ave_day = []
-    ave_night = []
+    # Sites sharing a time zone are interpolated together
+    groups = OrderedDict()
+    for site, tz in enumerate(timezones):
+        groups.setdefault(str(tz), (tz, []))[1].append(site)
 
-    radius = 0
-    for k in range(12):
+    temperature = np.empty((len(times), len(latitudes)))
+    for tz, sites in groups.values():
+        local_times = times if str(tz) == str(times.tz) else times.tz_convert(tz)
+        temperature[:, sites] = _clearsky_tamb_sites(local_times, longitudes[sites],
+                                                     climatologies[sites])
 
-        day = _get_pixel_value(a, lon_index, lat_index, k, radius)
-        night = _get_pixel_value(b, lon_index, lat_index, k, radius)
+    return pd.DataFrame(temperature, index=times)
 
-        if pd.isnull(day):
-            day = a[:, lat_index, k]
-        if pd.isnull(night):
-            night = a[:, lat_index, k]
 
-        ave_day.append(day)
-        ave_night.append(night)
+def _grid_indices(latitudes, longitudes, shape):
+    '''Longitude and latitude indexes of the grid pixels of the sites'''
+    lons, lats = shape[0], shape[1]
+    lon_temp = np.asarray(longitudes, dtype=float) - 180
+    lon_temp = np.where(lon_temp < 0, lon_temp + 360, lon_temp)
+    lon_index = np.round(float(lons) * lon_temp / 360.0).astype(int) % lons
+    lat_index = np.round(float(lats) * (90.0 - np.asarray(latitudes, dtype=float)) / 180.0).astype(int)
+    return lon_index, lat_index.clip(0, lats - 1)
 
-    for i in range(12):
-        df.loc[df['month'] == i + 1, 'day'] = ave_day[i]
-        df.loc[df['month'] == i + 1, 'night'] = ave_night[i]
 
-    df = df.rolling(window=window_size, win_type='gaussian', min_periods=1, center=True).mean(std=gauss_std)
+def _climatologies(lon_index, lat_index, window_size, gauss_std):
+    '''
+    Smoothed daily day and night temperatures of the grid pixels of the sites,
+    from the cache where available, as an array indexed by site, calendar (0
+    for common and 1 for leap years), zero-based day of year and day or night
+    '''
+    keys = [(int(i), int(j), window_size, gauss_std) for i, j in zip(lon_index, lat_index)]
+    climatologies = np.empty((len(keys), 2, 366, 2))
+
+    missing = []
+    with _climatology_cache_lock:
+        for site, key in enumerate(keys):
+            cached = _climatology_cache.pop(key, None)
+            if cached is None:
+                missing.append(site)
+            else:
+                _climatology_cache[key] = cached
+                climatologies[site] = cached
+
+    if missing:
+        a, b = _dataset.grids()
+        missing = np.array(missing)
+        pixels = (lon_index[missing], lat_index[missing])
+        climatologies[missing] = _smooth_climatologies(a[pixels].astype(float), b[pixels].astype(float),
+                                                       window_size, gauss_std)
+        with _climatology_cache_lock:
+            for site in missing:
+                _climatology_cache[keys[site]] = climatologies[site].copy()
+            while len(_climatology_cache) > _climatology_cache_size:
+                _climatology_cache.popitem(last=False)
+
+    return climatologies
+
+
+def _smooth_climatologies(ave_day, ave_night, window_size, gauss_std):
+    '''
+    Smoothed daily temperatures, as returned by _climatologies, from arrays of
+    monthly day and night temperatures with a row per site
+    '''
+    n_sites = len(ave_day)
+    climatologies = np.full((n_sites, 2, 366, 2), np.nan)
 
-    df = df.resample(freq_actual).interpolate(method='linear')
-    df['month'] = df.index.month
+    for calendar, month in enumerate(_YEAR_MONTHS):
+        days = len(month)
+        daily = np.hstack([ave_day[:, month].T, ave_night[:, month].T])
 
-    df = df.reindex(times, method='nearest')
+        # Repeat the year so the window wraps around from December to January
+        repeats = 2 * (window_size // 2 // days + 1) + 1
+        df = pd.DataFrame(np.tile(daily, (repeats, 1)))
+        df = df.rolling(window=window_size, win_type='gaussian', min_periods=1, center=True).mean(std=gauss_std)
+        start = repeats // 2 * days
+        year = df.values[start:start + days]
 
-    utc_offsets = [y.utcoffset().total_seconds() / 3600.0 for y in df.index]
+        climatologies[:, calendar, :days, 0] = year[:, :n_sites].T
+        climatologies[:, calendar, :days, 1] = year[:, n_sites:].T
 
-    def solar_noon_offset(utc_offset):
-        return longitude / 180.0 * 12.0 - utc_offset
+    return climatologies
 
-    df['solar_noon_offset'] = solar_noon_offset(np.array(utc_offsets))
 
-    df['hour_of_day'] = df.index.hour + df.index.minute / 60.0
-    df['Clear Sky Temperature (C)'] = _get_temperature(df['hour_of_day'].values, df['night'].values,\
-                                                       df['day'].values, df['solar_noon_offset'].values)
-    return df['Clear Sky Temperature (C)']
+def _daily_temperatures(times, climatologies):
+    '''
+    Day and night temperature arrays with a column per site, interpolated in
+    time between the smoothed temperatures at the local midnights around times
+    '''
+    days = pd.date_range(times.min().date(), times.max().date() + timedelta(days=1), freq='D',
+                         tz=times.tz)
+    calendar = days.is_leap_year.astype(int)
+    day_of_year = days.dayofyear.values - 1
 
+    midnights = days.asi8
+    i = np.searchsorted(midnights, times.asi8, side='right') - 1
+    fraction = (times.asi8 - midnights[i]) / (midnights[i + 1] - midnights[i]).astype(float)
 
-def _get_pixel_value(data, i, j, k, radius):
-    list = []
-    for x in arange(i - radius, i + radius + 1):
-        if x < 0 or x >= len(data[:, 0, 0]):
-            continue
-        for y in arange(j - radius, j + radius + 1):
-            if y < 0 or y >= len(data[0, :, 0]):
-                continue
+    before = climatologies[:, calendar[i], day_of_year[i]]
+    after = climatologies[:, calendar[i + 1], day_of_year[i + 1]]
+    values = before + (after - before) * fraction[:, np.newaxis]
+    return values[:, :, 0].T, values[:, :, 1].T
 
-            value = data[x, y, k]
-            if pd.isnull(value):
-                continue
 
-            list.append(value)
+def _clearsky_tamb_sites(times, longitudes, climatologies):
+    '''
+    Clear sky temperature array with a column per site, from the smoothed
+    daily temperatures of sites in the time zone of times
+    '''
+    day, night = _daily_temperatures(times, climatologies)
+    solar_noon_offset = longitudes / 180.0 * 12.0 - _utc_offset_hours(times)[:, np.newaxis]
+    hour_of_day = (times.hour + times.minute / 60.0).values[:, np.newaxis]
+    return _get_temperature(hour_of_day, night, day, solar_noon_offset)
 
-    if len(list) == 0:
-        return np.nan
 
-    return pd.Series(list).median()
+def _utc_offset_hours(times):
+    '''UTC offsets of a time zone aware DatetimeIndex in hours, from its local and UTC nanoseconds'''
+    if times.tz is None:
+        raise ValueError('times must be time zone aware')
+    return (times.tz_localize(None).asi8 - times.asi8) / (10.0**9 * 3600.0)
 
 
 def _get_temperature(hour_of_day, night_temp, day_temp, solar_noon_offset):
@@ -131,3 +325,7 @@ def _get_temperature(hour_of_day, night_temp, day_temp, solar_noon_offset):
     v = np.cos((hour_of_day + hour_offset) / 24.0 * 2.0 * np.pi)
     t = t_diff * 0.5 * v * temp_scaler + t_ave
     return t
+
+
+if __name__ == '__main__':
+    _build_temperature_grids()
@@ -5,12 +5,25 @@ photovoltaic systems.
 '''
 
 from __future__ import division
+from multiprocessing.pool import ThreadPool
+import bisect
+import heapq
+import warnings
 import pandas as pd
 import numpy as np
 import statsmodels.api as sm
 
+# Number of bootstrap replicates drawn from each independent random stream
+# when a random_state is given. Fixed so results do not depend on workers.
+_BOOTSTRAP_BLOCK = 100
 
-def degradation_ols(normalized_energy, confidence_level=68.2):
+# Year on year pairing tolerance and one hour, in nanoseconds
+_YOY_TOLERANCE = pd.Timedelta('8D').value
+_HOUR = pd.Timedelta('1h').value
+
+
+def degradation_ols(normalized_energy, confidence_level=68.2, random_state=None,
+                    ci_method='monte_carlo'):
     '''
     Description
     -----------
@@ -21,6 +34,14 @@ def degradation_ols(normalized_energy, confidence_level=68.2):
     normalized_energy: Pandas Time Series (numeric)
         Daily or lower frequency time series of normalized system ouput.
     confidence_level: the size of the confidence interval to return, in percent
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        seed of the Monte Carlo confidence interval. None uses the global
+        numpy random state.
+    ci_method: str, default 'monte_carlo'
+        method for the confidence interval of the ratio slope / intercept.
+        'monte_carlo' samples the fitted parameter distribution, 'delta' uses
+        the first order delta method and 'fieller' uses Fieller's theorem.
+        The closed form methods are deterministic and much faster.
 
     Returns
     -------
@@ -60,8 +81,9 @@ def degradation_ols(normalized_energy, confidence_level=68.2):
     # Collect standrd errors
     stderr_b, stderr_m = results.bse
 
-    # Monte Carlo for error in degradation rate
-    Rd_CI = _degradation_CI(results, confidence_level=confidence_level)
+    # Confidence interval of degradation rate
+    Rd_CI = _degradation_CI(results, confidence_level=confidence_level,
+                            random_state=random_state, method=ci_method)
 
     calc_info = {
         'slope': m,
@@ -75,7 +97,345 @@ def degradation_ols(normalized_energy, confidence_level=68.2):
     return (Rd_pct, Rd_CI, calc_info)
 
 
-def degradation_classical_decomposition(normalized_energy, confidence_level=68.2):
+def degradation_ols_fleet(normalized_energy, confidence_level=68.2, ci_method='delta',
+                          random_state=None):
+    '''
+    Description
+    -----------
+    OLS routine for many systems sharing one time index. Every column is
+    fit at once with closed form least squares. The degradation rates, fit
+    statistics and standard errors equal those of degradation_ols on each
+    column. The confidence intervals do not match by default, because
+    ci_method defaults to the closed form 'delta' method here, while
+    degradation_ols defaults to 'monte_carlo'.
+
+    Parameters
+    ----------
+    normalized_energy: Pandas DataFrame (numeric)
+        Daily or lower frequency time series of normalized system ouput,
+        one column per system. Missing values are dropped per column.
+    confidence_level: the size of the confidence interval to return, in percent
+    ci_method: str, default 'delta'
+        method for the confidence interval, 'delta', 'fieller' or
+        'monte_carlo'. See degradation_ols. 'monte_carlo' draws for each
+        column in turn.
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        seed of the Monte Carlo confidence interval. None uses the global
+        numpy random state.
+
+    Returns
+    -------
+    (degradation rates, confidence intervals, calc_info)
+        degradation rates: numpy array, in the order of normalized_energy.columns
+        confidence intervals: numpy array of shape (n_columns, 2)
+        calc_info is a dict that contains numpy arrays of slope, intercept,
+        root mean square error of regression ('rmse'), standard error
+        of the slope ('slope_stderr') and intercept ('intercept_stderr'),
+        and a mapping from column to least squares RegressionResults object
+        ('ols_result') which fits a column only when it is accessed
+    '''
+
+    # calculate a years column as x value for regression, ignoreing leap years
+    day_diffs = (normalized_energy.index - normalized_energy.index[0])
+    days = np.asarray(day_diffs.astype('timedelta64[s]'), dtype=float) / (60 * 60 * 24)
+    years = days / 365.0
+
+    n_columns = normalized_energy.shape[1]
+    b = np.empty(n_columns)
+    m = np.empty(n_columns)
+    var_b = np.empty(n_columns)
+    var_m = np.empty(n_columns)
+    cov_bm = np.empty(n_columns)
+    mse = np.empty(n_columns)
+    n_points = np.empty(n_columns, dtype=int)
+
+    # Solve the normal equations on centered data, in column blocks to bound
+    # the size of the temporaries
+    block = 1024
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, n_columns, block):
+            cols = slice(start, min(start + block, n_columns))
+            y = np.asarray(normalized_energy.iloc[:, cols], dtype=float)
+            valid = ~np.isnan(y)
+            n = valid.sum(axis=0)
+            n_points[cols] = n
+
+            x_mean = years.dot(valid) / n
+            y_mean = np.nansum(y, axis=0) / n
+            x_centered = np.where(valid, years[:, np.newaxis] - x_mean, 0.0)
+            y_centered = np.where(valid, y - y_mean, 0.0)
+
+            sxx = np.sum(x_centered ** 2, axis=0)
+            m[cols] = np.sum(x_centered * y_centered, axis=0) / sxx
+            b[cols] = y_mean - m[cols] * x_mean
+
+            residuals = y_centered - m[cols] * x_centered
+            mse[cols] = np.sum(residuals ** 2, axis=0) / (n - 2)
+
+            var_m[cols] = mse[cols] / sxx
+            var_b[cols] = mse[cols] * (1.0 / n + x_mean ** 2 / sxx)
+            cov_bm[cols] = -mse[cols] * x_mean / sxx
+
+        # rate of degradation in terms of percent/year
+        Rd_pct = 100.0 * m / b
+
+        # Confidence interval of degradation rate
+        if ci_method == 'monte_carlo':
+            rng = None if random_state is None else _generator(random_state)
+            Rd_CI = np.empty((n_columns, 2))
+            for i in range(n_columns):
+                params = np.array([b[i], m[i]])
+                cov = np.array([[var_b[i], cov_bm[i]], [cov_bm[i], var_m[i]]])
+                # Columns with too few points have no covariance to draw from
+                if n_points[i] < 3 or not (np.isfinite(params).all() and np.isfinite(cov).all()):
+                    Rd_CI[i] = np.nan
+                    continue
+                Rd_CI[i] = _degradation_CI(_ParamsCov(params, cov), confidence_level,
+                                           random_state=rng)
+        else:
+            Rd_CI = _ratio_CI(b, m, var_b, var_m, cov_bm, confidence_level, ci_method).T
+
+    calc_info = {
+        'slope': m,
+        'intercept': b,
+        'rmse': np.sqrt(mse),
+        'slope_stderr': np.sqrt(var_m),
+        'intercept_stderr': np.sqrt(var_b),
+        'ols_result': _LazyOLSResults(normalized_energy, years),
+    }
+
+    return (Rd_pct, Rd_CI, calc_info)
+
+
+class OLSAccumulator(object):
+    '''
+    Description
+    -----------
+    Online version of degradation_ols. Normalized energy points are added
+    as they arrive and the least squares fit of normalized energy against
+    years since start is available at any time, without refitting on the
+    full history. The state is the count and the means and centered sums
+    of squares and products of years and normalized energy, which are
+    equivalent to (n, sum(x), sum(y), sum(xy), sum(x**2), sum(y**2)) but
+    numerically stable. Updates and results are O(1), and accumulators of
+    parallel shards can be combined with merge.
+
+    Parameters
+    ----------
+    start: timestamp, default None
+        reference time of zero years. None uses the first timestamp added,
+        which gives the same fit as degradation_ols on the same points.
+    '''
+
+    def __init__(self, start=None):
+        self.start = None if start is None else pd.Timestamp(start)
+        self.n = 0
+        self._mean_x = 0.0
+        self._mean_y = 0.0
+        self._sxx = 0.0
+        self._sxy = 0.0
+        self._syy = 0.0
+
+    def _years(self, timestamps):
+        # calculate years as x value for regression, ignoreing leap years
+        seconds = (np.asarray(timestamps, dtype=np.int64) - self.start.value) // 10**9
+        days = seconds / (60 * 60 * 24)
+        return days / 365.0
+
+    def add(self, timestamp, energy):
+        '''Add one normalized energy value. NaN values are ignored.'''
+
+        timestamp = pd.Timestamp(timestamp)
+        if self.start is None:
+            self.start = timestamp
+        if np.isnan(energy):
+            return
+
+        x = self._years([timestamp.value])[0]
+        self.n += 1
+        dx = x - self._mean_x
+        dy = energy - self._mean_y
+        self._mean_x += dx / self.n
+        self._mean_y += dy / self.n
+        self._sxx += dx * (x - self._mean_x)
+        self._sxy += dx * (energy - self._mean_y)
+        self._syy += dy * (energy - self._mean_y)
+
+    def update(self, normalized_energy):
+        '''Add the points of a Pandas Time Series (numeric) of normalized energy'''
+
+        if self.start is None and len(normalized_energy):
+            self.start = normalized_energy.index.min()
+        normalized_energy = normalized_energy.dropna()
+        if not len(normalized_energy):
+            return
+
+        batch = OLSAccumulator(self.start)
+        x = batch._years(normalized_energy.index.asi8)
+        y = normalized_energy.values.astype(float)
+        batch.n = len(y)
+        batch._mean_x = x.mean()
+        batch._mean_y = y.mean()
+        batch._sxx = np.sum((x - batch._mean_x) ** 2)
+        batch._sxy = np.sum((x - batch._mean_x) * (y - batch._mean_y))
+        batch._syy = np.sum((y - batch._mean_y) ** 2)
+        self._combine(batch)
+
+    def merge(self, other):
+        '''
+        Accumulator of the points of this and another accumulator, relative
+        to the earlier of their start times
+        '''
+
+        starts = [acc.start for acc in (self, other) if acc.start is not None]
+        merged = OLSAccumulator(min(starts) if starts else None)
+        for accumulator in (self, other):
+            if accumulator.n:
+                shifted = OLSAccumulator.from_dict(accumulator.to_dict())
+                # moving the origin shifts the mean of x only
+                shifted._mean_x += merged._years([accumulator.start.value])[0]
+                merged._combine(shifted)
+        return merged
+
+    def _combine(self, other):
+        # pairwise update of means and centered sums (Chan et al.)
+        if not other.n:
+            return
+        n = self.n + other.n
+        dx = other._mean_x - self._mean_x
+        dy = other._mean_y - self._mean_y
+        weight = self.n * other.n / float(n)
+        self._sxx += other._sxx + dx * dx * weight
+        self._sxy += other._sxy + dx * dy * weight
+        self._syy += other._syy + dy * dy * weight
+        self._mean_x += dx * other.n / float(n)
+        self._mean_y += dy * other.n / float(n)
+        self.n = n
+
+    @property
+    def slope(self):
+        return self._sxy / self._sxx
+
+    @property
+    def intercept(self):
+        return self._mean_y - self.slope * self._mean_x
+
+    @property
+    def degradation_rate(self):
+        '''rate of degradation in terms of percent/year'''
+        return 100.0 * self.slope / self.intercept
+
+    def _mse(self):
+        return (self._syy - self.slope * self._sxy) / (self.n - 2)
+
+    def confidence_interval(self, confidence_level=68.2, ci_method='delta'):
+        '''
+        Description
+        -----------
+        Degradation rate and closed form confidence interval of the current fit
+
+        Parameters
+        ----------
+        confidence_level: the size of the confidence interval to return, in percent
+        ci_method: str, 'delta' (default) or 'fieller', see degradation_ols
+
+        Returns
+        -------
+        (degradation rate, confidence interval, calc_info)
+            calc_info is a dict that contains slope, intercept,
+            root mean square error of regression ('rmse'), standard error
+            of the slope ('slope_stderr') and intercept ('intercept_stderr')
+        '''
+
+        if self.n < 3:
+            raise ValueError('at least three points are required')
+
+        b, m = self.intercept, self.slope
+        mse = self._mse()
+        var_m = mse / self._sxx
+        var_b = mse * (1.0 / self.n + self._mean_x ** 2 / self._sxx)
+        cov_bm = -mse * self._mean_x / self._sxx
+
+        Rd_CI = _ratio_CI(b, m, var_b, var_m, cov_bm, confidence_level, ci_method)
+
+        calc_info = {
+            'slope': m,
+            'intercept': b,
+            'rmse': np.sqrt(mse),
+            'slope_stderr': np.sqrt(var_m),
+            'intercept_stderr': np.sqrt(var_b),
+        }
+
+        return (self.degradation_rate, Rd_CI, calc_info)
+
+    def to_dict(self):
+        '''State as a dict of JSON serializable values'''
+        return {
+            'start': None if self.start is None else self.start.isoformat(),
+            'n': self.n,
+            'mean_x': self._mean_x,
+            'mean_y': self._mean_y,
+            'sxx': self._sxx,
+            'sxy': self._sxy,
+            'syy': self._syy,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        '''Accumulator restored from the output of to_dict'''
+        accumulator = cls(state['start'])
+        accumulator.n = state['n']
+        accumulator._mean_x = state['mean_x']
+        accumulator._mean_y = state['mean_y']
+        accumulator._sxx = state['sxx']
+        accumulator._sxy = state['sxy']
+        accumulator._syy = state['syy']
+        return accumulator
+
+
+class _ParamsCov(object):
+    '''Parameter estimates and covariance in the interface of OLSResults used by _degradation_CI'''
+
+    def __init__(self, params, cov):
+        self.params = params
+        self._cov = cov
+
+    def cov_params(self):
+        return self._cov
+
+
+class _LazyOLSResults(object):
+    '''
+    Mapping from the columns of a DataFrame of normalized energy to the
+    statsmodels RegressionResults of degradation_ols, fit and cached on first
+    access of each column
+    '''
+
+    def __init__(self, normalized_energy, years):
+        self._normalized_energy = normalized_energy
+        self._exog = sm.add_constant(pd.DataFrame({'years': years},
+                                                  index=normalized_energy.index))
+        self._results = {}
+
+    def __getitem__(self, column):
+        if column not in self._results:
+            endog = self._normalized_energy[column].rename('normalized_energy')
+            ols_model = sm.OLS(endog=endog, exog=self._exog, hasconst=True, missing='drop')
+            self._results[column] = ols_model.fit()
+        return self._results[column]
+
+    def __iter__(self):
+        return iter(self._normalized_energy.columns)
+
+    def __len__(self):
+        return self._normalized_energy.shape[1]
+
+    def keys(self):
+        return list(self._normalized_energy.columns)
+
+
+def degradation_classical_decomposition(normalized_energy, confidence_level=68.2, random_state=None,
+                                        ci_method='monte_carlo'):
     '''
     Description
     -----------
@@ -87,6 +447,14 @@ def degradation_classical_decomposition(normalized_energy, confidence_level=68.2
         Daily or lower frequency time series of normalized system ouput.
         Must be regular time series.
     confidence_level: the size of the confidence interval to return, in percent
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        seed of the Monte Carlo confidence interval. None uses the global
+        numpy random state.
+    ci_method: str, default 'monte_carlo'
+        method for the confidence interval of the ratio slope / intercept.
+        'monte_carlo' samples the fitted parameter distribution, 'delta' uses
+        the first order delta method and 'fieller' uses Fieller's theorem.
+        The closed form methods are deterministic and much faster.
 
     Returns
     -------
@@ -117,15 +485,24 @@ def degradation_classical_decomposition(normalized_energy, confidence_level=68.2
     df['days'] = day_diffs.astype('timedelta64[s]') / (60 * 60 * 24)
     df['years'] = df.days / 365.0
 
-    # Compute yearly rolling mean to isolate trend component using moving average
-    it = df.iterrows()
-    energy_ma = []
-    for i, row in it:
-        if row.years - 0.5 >= min(df.years) and row.years + 0.5 <= max(df.years):
-            roll = df[(df.years <= row.years + 0.5) & (df.years >= row.years - 0.5)]
-            energy_ma.append(roll.normalized_energy.mean())
-        else:
-            energy_ma.append(np.nan)
+    # Compute yearly rolling mean to isolate trend component using moving average.
+    # Window bounds come from searchsorted on the (sorted) years and the window
+    # means from cumulative sums, so the moving average is O(n).
+    years = df.years.values
+    energy = df.normalized_energy.values
+    lower = np.searchsorted(years, years - 0.5, side='left')
+    upper = np.searchsorted(years, years + 0.5, side='right')
+
+    valid = ~np.isnan(energy)
+    energy_cumsum = np.concatenate([[0.0], np.cumsum(np.where(valid, energy, 0.0))])
+    count_cumsum = np.concatenate([[0], np.cumsum(valid)])
+    window_sum = energy_cumsum[upper] - energy_cumsum[lower]
+    window_count = count_cumsum[upper] - count_cumsum[lower]
+
+    # Only a full year centered on the point gives a valid average
+    full_window = (years - 0.5 >= years.min()) & (years + 0.5 <= years.max()) & (window_count > 0)
+    energy_ma = np.full(len(years), np.nan)
+    energy_ma[full_window] = window_sum[full_window] / window_count[full_window]
 
     df['energy_ma'] = energy_ma
 
@@ -153,8 +530,9 @@ def degradation_classical_decomposition(normalized_energy, confidence_level=68.2
     # Perform Mann-Kendall
     test_trend, h, p, z = _mk_test(df.energy_ma.dropna(), alpha=0.05)
 
-    # Monte Carlo for error in degradation rate
-    Rd_CI = _degradation_CI(results, confidence_level=confidence_level)
+    # Confidence interval of degradation rate
+    Rd_CI = _degradation_CI(results, confidence_level=confidence_level,
+                            random_state=random_state, method=ci_method)
 
     calc_info = {
         'slope': m,
@@ -170,7 +548,8 @@ def degradation_classical_decomposition(normalized_energy, confidence_level=68.2
     return (Rd_pct, Rd_CI, calc_info)
 
 
-def degradation_year_on_year(normalized_energy, recenter=True, exceedance_prob=95, confidence_level=68.2):
+def degradation_year_on_year(normalized_energy, recenter=True, exceedance_prob=95, confidence_level=68.2,
+                             bootstrap_memory=2**26, random_state=None, workers=1):
     '''
     Description
     -----------
@@ -184,6 +563,18 @@ def degradation_year_on_year(normalized_energy, recenter=True, exceedance_prob=9
         specify whether data is centered to normalized yield of 1 based on first year
     exceedance_prob (float): the probability level to use for exceedance value calculation
     confidence_level: the size of the confidence interval to return, in percent
+    bootstrap_memory: int, default 2**26 (64 MiB)
+        approximate ceiling in bytes on the working memory of the bootstrap.
+        Resamples that do not fit are drawn and reduced in chunks; the result
+        does not depend on this value.
+        Applies when random_state is None.
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        seed of the bootstrap. None draws from the global numpy random state.
+        Otherwise replicates are drawn in blocks from independent child
+        streams spawned from the seed, which can run in parallel.
+    workers: int, default 1
+        number of threads running bootstrap blocks when random_state is
+        given. The result does not depend on this value.
 
     Returns
     -------
@@ -221,24 +612,14 @@ def degradation_year_on_year(normalized_energy, recenter=True, exceedance_prob=9
     else:
         renorm = 1.0
 
-    normalized_energy = normalized_energy.reset_index()
-    normalized_energy['energy'] = normalized_energy['energy'] / renorm
+    energy = normalized_energy.values / renorm
 
-    normalized_energy['dt_shifted'] = normalized_energy.dt + pd.DateOffset(years=1)
+    # Pair each point with what happened one year ago
+    partner, time_diff_years = _yoy_pairs(normalized_energy.index)
+    energy_right = np.where(partner >= 0, energy[partner], np.nan)
 
-    # Merge with what happened one year ago, use tolerance of 8 days to allow for
-    # weekly aggregated data
-    df = pd.merge_asof(normalized_energy[['dt', 'energy']], normalized_energy,
-                       left_on='dt', right_on='dt_shifted',
-                       suffixes=['', '_right'],
-                       tolerance=pd.Timedelta('8D')
-                       )
-
-    df['time_diff_years'] = (df.dt - df.dt_right).astype('timedelta64[h]') / 8760.0
-    df['yoy'] = 100.0 * (df.energy - df.energy_right) / (df.time_diff_years)
-    df.index = df.dt
-
-    yoy_result = df.yoy.dropna()
+    yoy = 100.0 * (energy - energy_right) / time_diff_years
+    yoy_result = pd.Series(yoy, index=normalized_energy.index, name='yoy').dropna()
 
     calc_info = {
         'YoY_values': yoy_result,
@@ -251,19 +632,633 @@ def degradation_year_on_year(normalized_energy, recenter=True, exceedance_prob=9
     Rd_pct = yoy_result.median()
 
     # bootstrap to determine 68% CI and exceedance probability
-    n1 = len(yoy_result)
+    Rd_CI, P_level = _yoy_bootstrap(yoy_result.values, confidence_level, exceedance_prob,
+                                    bootstrap_memory, random_state, workers)
+
+    calc_info['exceedance_level'] = P_level
+
+    return (Rd_pct, Rd_CI, calc_info)
+
+
+def degradation_year_on_year_fleet(normalized_energy, recenter=True, exceedance_prob=95,
+                                   confidence_level=68.2, bootstrap_memory=2**26,
+                                   random_state=None, workers=1):
+    '''
+    Description
+    -----------
+    Year-on-year decomposition method for many systems sharing one time
+    index. Year-on-year pairs are found once from the shared index, and the
+    slopes and their medians are computed for all columns together. The
+    bootstrap confidence intervals and exceedance levels are still drawn for
+    each column in turn, as a batched draw could not reproduce the random
+    draws of the single column function. Each column gives the same
+    result as degradation_year_on_year on that column (including its
+    missing values): with random_state None the columns draw from the global
+    numpy random state in column order, otherwise column i uses the i-th
+    child spawned from the SeedSequence of random_state.
+
+    Parameters
+    ----------
+    normalized_energy: Pandas DataFrame (numeric)
+        Daily or lower frequency time series of normalized system ouput,
+        one column per system.
+    recenter:  bool, default value True
+        specify whether data is centered to normalized yield of 1 based on first year
+    exceedance_prob (float): the probability level to use for exceedance value calculation
+    confidence_level: the size of the confidence interval to return, in percent
+    bootstrap_memory: int, default 2**26 (64 MiB)
+        approximate ceiling in bytes on the working memory of each bootstrap.
+        See degradation_year_on_year.
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        seed of the bootstraps. See degradation_year_on_year.
+    workers: int, default 1
+        number of threads running bootstrap blocks when random_state is given.
+
+    Returns
+    -------
+    Pandas DataFrame indexed by the columns of normalized_energy with columns
+        'Rd_pct': rate of relative performance change in %/yr
+        'Rd_CI_lower', 'Rd_CI_upper': confidence interval (size specified by
+            confidence_level) of degradation rate estimate
+        'exceedance_level': the degradation rate that was outperformed with
+            probability of exceedance_prob
+        'renormalizing_factor': value used to recenter data
+        'n_pairs': number of year on year slopes
+    Columns without year on year pairs have NaN results.
+    '''
+
+    # Ensure the data is in order
+    normalized_energy = normalized_energy.sort_index()
+
+    # Detect sub-daily data:
+    if min(np.diff(normalized_energy.index.values, n=1)) < np.timedelta64(23, 'h'):
+        raise ValueError('normalized_energy must not be more frequent than daily')
+
+    # Detect less than 2 years of data
+    if normalized_energy.index[-1] - normalized_energy.index[0] < pd.Timedelta('730d'):
+        raise ValueError('must provide at least two years of normalized energy')
+
+    # Auto center
+    if recenter:
+        start = normalized_energy.index[0]
+        oneyear = start + pd.Timedelta('364d')
+        renorm = normalized_energy[start:oneyear].median().values
+    else:
+        renorm = np.ones(normalized_energy.shape[1])
+
+    energy = normalized_energy.values / renorm
+
+    # Pair each point with what happened one year ago, once for all columns
+    partner, time_diff_years = _yoy_pairs(normalized_energy.index)
+    paired = partner >= 0
+    yoy = (100.0 * (energy[paired] - energy[partner[paired]]) /
+           time_diff_years[paired, np.newaxis])
+
+    if random_state is not None:
+        seeds = _seed_sequence(random_state).spawn(normalized_energy.shape[1])
+
+    results = np.full((normalized_energy.shape[1], 5), np.nan)
+    valid = ~np.isnan(yoy)
+    results[:, 4] = valid.sum(axis=0)
+    with warnings.catch_warnings():
+        # columns without pairs have a NaN median
+        warnings.simplefilter('ignore', RuntimeWarning)
+        results[:, 0] = np.nanmedian(yoy, axis=0)
+
+    # bootstrap to determine 68% CI and exceedance probability
+    for i in range(normalized_energy.shape[1]):
+        yoy_result = yoy[valid[:, i], i]
+        if not len(yoy_result):
+            continue
+
+        results[i, 1:3], results[i, 3] = _yoy_bootstrap(
+            yoy_result, confidence_level, exceedance_prob, bootstrap_memory,
+            None if random_state is None else seeds[i], workers)
+
+    results = pd.DataFrame(results, index=normalized_energy.columns,
+                           columns=['Rd_pct', 'Rd_CI_lower', 'Rd_CI_upper',
+                                    'exceedance_level', 'n_pairs'])
+    results.insert(4, 'renormalizing_factor', renorm)
+    results['n_pairs'] = results['n_pairs'].astype(int)
+
+    return results
+
+
+class YoYAccumulator(object):
+    '''
+    Description
+    -----------
+    Streaming year-on-year degradation estimator. Normalized energy points
+    are added in time order; each new point is paired with the retained
+    point one year earlier as in degradation_year_on_year, and the median of
+    the year on year slopes is kept with two heaps, so the current
+    degradation rate is available after an O(log n) update. The bootstrap
+    confidence interval is computed on demand.
+
+    Fed with the points of a series, the results equal those of
+    degradation_year_on_year on that series, except that no minimum of two
+    years of data is enforced.
+
+    The state is serializable with to_dict and from_dict.
+
+    Parameters
+    ----------
+    recenter:  bool, default value True
+        specify whether data is centered to normalized yield of 1 based on first year.
+        Year on year slopes are available once the first year is complete.
+    '''
+
+    def __init__(self, recenter=True):
+        self.recenter = recenter
+        self.renormalizing_factor = None if recenter else 1.0
+        self._tz = None
+        self._start = None
+        self._last = None
+        # retained (timestamp, shifted timestamp, energy) in time order, at most
+        # about one year of points, and their shifted timestamps for bisection
+        self._window = []
+        self._shifted = []
+        # year on year pairs (timestamp, energy, energy_right, time_diff_years)
+        # waiting for the renormalizing factor
+        self._pending = []
+        self._times = []
+        self._yoy = []
+        # max heap (negated) of the lower half and min heap of the upper half
+        self._lower = []
+        self._upper = []
+
+    def update(self, normalized_energy):
+        '''
+        Add the points of a Pandas Time Series (numeric) of normalized energy,
+        later than any point added before
+        '''
+        for timestamp, energy in normalized_energy.sort_index().items():
+            self.add(timestamp, energy)
+
+    def add(self, timestamp, energy):
+        '''
+        Add one normalized energy value, later than any point added before
+        '''
+
+        timestamp = pd.Timestamp(timestamp)
+        if self._start is None:
+            self._tz = timestamp.tz
+            self._start = timestamp
+        elif timestamp - self._last < pd.Timedelta('23h'):
+            raise ValueError('normalized_energy must be in time order and not more '
+                             'frequent than daily')
+        self._last = timestamp
+
+        # Pair with the last point whose shifted timestamp is at or before this
+        # one, within a tolerance of 8 days
+        position = bisect.bisect_right(self._shifted, timestamp.value) - 1
+        if position >= 0 and timestamp.value - self._window[position][1] <= _YOY_TOLERANCE:
+            partner_time, _, partner_energy = self._window[position]
+            hours = (timestamp.value - partner_time) // _HOUR
+            self._pending.append((timestamp.value, energy, partner_energy, hours / 8760.0))
+
+        shifted = timestamp + pd.DateOffset(years=1)
+        self._window.append((timestamp.value, shifted.value, energy))
+        self._shifted.append(shifted.value)
+
+        if self.renormalizing_factor is None:
+            oneyear = self._start + pd.Timedelta('364d')
+            if timestamp > oneyear:
+                first_year = [point[2] for point in self._window if point[0] <= oneyear.value]
+                self.renormalizing_factor = pd.Series(first_year).median()
+
+        if self.renormalizing_factor is not None:
+            self._flush()
+            # drop points that can no longer be paired with later points
+            stale = bisect.bisect_left(self._shifted, timestamp.value - _YOY_TOLERANCE)
+            del self._window[:stale]
+            del self._shifted[:stale]
+
+    def _flush(self):
+        renorm = self.renormalizing_factor
+        for time, energy, energy_right, time_diff_years in self._pending:
+            yoy = 100.0 * (energy / renorm - energy_right / renorm) / time_diff_years
+            if np.isnan(yoy):
+                continue
+            self._times.append(time)
+            self._yoy.append(yoy)
+            self._push(yoy)
+        self._pending = []
+
+    def _push(self, value):
+        if self._lower and value > -self._lower[0]:
+            heapq.heappush(self._upper, value)
+        else:
+            heapq.heappush(self._lower, -value)
+
+        if len(self._lower) > len(self._upper) + 1:
+            heapq.heappush(self._upper, -heapq.heappop(self._lower))
+        elif len(self._upper) > len(self._lower):
+            heapq.heappush(self._lower, -heapq.heappop(self._upper))
+
+    @property
+    def n_pairs(self):
+        '''Number of year on year slopes'''
+        return len(self._yoy)
+
+    @property
+    def degradation_rate(self):
+        '''Median of the year on year slopes in %/yr, NaN if there are none'''
+        if not self._lower:
+            return np.nan
+        if len(self._lower) > len(self._upper):
+            return -self._lower[0]
+        return (-self._lower[0] + self._upper[0]) / 2.0
+
+    def confidence_interval(self, exceedance_prob=95, confidence_level=68.2,
+                            bootstrap_memory=2**26, random_state=None, workers=1):
+        '''
+        Description
+        -----------
+        Bootstrap confidence interval of the current degradation rate
+
+        Parameters
+        ----------
+        exceedance_prob, confidence_level, bootstrap_memory, random_state, workers:
+            see degradation_year_on_year
+
+        Returns
+        -------
+        tuple of (degradation_rate, confidence_interval, calc_info)
+            as returned by degradation_year_on_year
+        '''
+
+        if not self._yoy:
+            raise ValueError('no year-over-year aggregated data pairs found')
+
+        index = pd.DatetimeIndex(np.array(self._times, dtype='datetime64[ns]'), name='dt')
+        if self._tz is not None:
+            index = index.tz_localize('UTC').tz_convert(self._tz)
+        yoy_result = pd.Series(self._yoy, index=index, name='yoy')
+
+        Rd_CI, P_level = _yoy_bootstrap(yoy_result.values, confidence_level, exceedance_prob,
+                                        bootstrap_memory, random_state, workers)
+
+        calc_info = {
+            'YoY_values': yoy_result,
+            'renormalizing_factor': self.renormalizing_factor,
+            'exceedance_level': P_level
+        }
+
+        return (self.degradation_rate, Rd_CI, calc_info)
+
+    def to_dict(self):
+        '''State as a dict of JSON serializable values'''
+        return {
+            'recenter': self.recenter,
+            'renormalizing_factor': self.renormalizing_factor,
+            'tz': None if self._tz is None else str(self._tz),
+            'start': None if self._start is None else self._start.value,
+            'last': None if self._last is None else self._last.value,
+            'window': [list(point) for point in self._window],
+            'pending': [list(pair) for pair in self._pending],
+            'times': list(self._times),
+            'yoy': list(self._yoy),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        '''Accumulator restored from the output of to_dict'''
+
+        def _timestamp(value):
+            if value is None:
+                return None
+            timestamp = pd.Timestamp(value, tz='UTC')
+            return timestamp.tz_convert(state['tz']) if state['tz'] else timestamp.tz_localize(None)
+
+        accumulator = cls(recenter=state['recenter'])
+        accumulator.renormalizing_factor = state['renormalizing_factor']
+        accumulator._start = _timestamp(state['start'])
+        accumulator._last = _timestamp(state['last'])
+        accumulator._tz = None if accumulator._start is None else accumulator._start.tz
+        accumulator._window = [tuple(point) for point in state['window']]
+        accumulator._shifted = [point[1] for point in accumulator._window]
+        accumulator._pending = [tuple(pair) for pair in state['pending']]
+        accumulator._times = list(state['times'])
+        accumulator._yoy = list(state['yoy'])
+        for value in accumulator._yoy:
+            accumulator._push(value)
+        return accumulator
+
+
+def _yoy_bootstrap(yoy_result, confidence_level, exceedance_prob, bootstrap_memory,
+                   random_state, workers):
+    '''
+    Description
+    -----------
+    Bootstrap confidence interval and exceedance level of the median of
+    year on year slopes
+
+    Parameters
+    ----------
+    yoy_result: numpy array of year on year slopes, must not contain NaN
+    confidence_level, exceedance_prob, bootstrap_memory, random_state, workers:
+        see degradation_year_on_year
+
+    Returns
+    -------
+    tuple of (confidence interval, exceedance level)
+    '''
+
     reps = 10000
-    xb1 = np.random.choice(yoy_result, (n1, reps), replace=True)
-    mb1 = np.median(xb1, axis=0)
+    if random_state is None:
+        mb1 = _bootstrap_medians(yoy_result, reps, bootstrap_memory)
+    else:
+        mb1 = _seeded_bootstrap_medians(yoy_result, reps, random_state, workers)
 
     half_ci = confidence_level / 2.0
     Rd_CI = np.percentile(mb1, [50.0 - half_ci, 50.0 + half_ci])
 
     P_level = np.percentile(mb1, 100.0 - exceedance_prob)
 
-    calc_info['exceedance_level'] = P_level
+    return Rd_CI, P_level
 
-    return (Rd_pct, Rd_CI, calc_info)
+
+def _yoy_pairs(index):
+    '''
+    Description
+    -----------
+    Pair each timestamp with the timestamp one year earlier, within a
+    tolerance of 8 days to allow for weekly aggregated data
+
+    Parameters
+    ----------
+    index: sorted Pandas DatetimeIndex
+
+    Returns
+    -------
+    tuple of (partner, time_diff_years)
+        partner: numpy int array, position of the timestamp one year
+            earlier, -1 where there is none
+        time_diff_years: numpy float array, time between the pair in years
+            of 8760 hours, NaN where there is no pair
+    '''
+
+    # Regular series (constant step in local time) are paired with integer
+    # arithmetic on int64 nanosecond timestamps instead of merge_asof
+    local = index.tz_localize(None) if index.tz is not None else index
+    steps = np.diff(local.asi8)
+    if len(steps) and (steps == steps[0]).all():
+        pairs = _regular_yoy_pairs(index)
+        if pairs is not None:
+            return pairs
+
+    timestamps = pd.DataFrame({'dt': index, 'position': np.arange(len(index))})
+    timestamps['dt_shifted'] = timestamps.dt + pd.DateOffset(years=1)
+
+    df = pd.merge_asof(timestamps[['dt']], timestamps,
+                       left_on='dt', right_on='dt_shifted',
+                       suffixes=['', '_right'],
+                       tolerance=pd.Timedelta('8D')
+                       )
+
+    partner = df.position.fillna(-1).values.astype(int)
+    time_diff_years = ((df.dt - df.dt_right).astype('timedelta64[h]') / 8760.0).values
+    return partner, time_diff_years
+
+
+def _regular_yoy_pairs(index):
+    '''
+    Description
+    -----------
+    Fast path of _yoy_pairs for a regular index. Timestamps are shifted by
+    one calendar year in local time with numpy datetime arithmetic, clipping
+    February 29 to February 28 like pd.DateOffset(years=1), and partners are
+    found with searchsorted on the int64 nanosecond timestamps. Returns None
+    if the shifted timestamps are not in order, which can happen for steps
+    shorter than a day around February 29.
+    '''
+
+    local = index.tz_localize(None) if index.tz is not None else index
+    timestamps = local.values
+
+    days = timestamps.astype('datetime64[D]')
+    time_of_day = timestamps - days
+    months = days.astype('datetime64[M]')
+    day_of_month = days - months.astype('datetime64[D]')
+
+    shifted_months = months + np.timedelta64(12, 'M')
+    month_start = shifted_months.astype('datetime64[D]')
+    last_day = (shifted_months + np.timedelta64(1, 'M')).astype('datetime64[D]') - month_start
+    shifted = month_start + np.minimum(day_of_month, last_day - np.timedelta64(1, 'D'))
+    shifted = pd.DatetimeIndex(shifted + time_of_day)
+    if index.tz is not None:
+        shifted = shifted.tz_localize(index.tz)
+
+    # backward match: the last shifted timestamp at or before each timestamp
+    # within a tolerance of 8 days
+    values = index.asi8
+    shifted = shifted.asi8
+    if (np.diff(shifted) < 0).any():
+        return None
+    partner = np.searchsorted(shifted, values, side='right') - 1
+    paired = (partner >= 0) & (values - shifted[np.maximum(partner, 0)] <= _YOY_TOLERANCE)
+    partner = np.where(paired, partner, -1)
+
+    # time difference in whole hours, as from timedelta64[h]
+    hours = (values - values[partner]) // _HOUR
+    time_diff_years = np.where(paired, hours / 8760.0, np.nan)
+    return partner, time_diff_years
+
+
+def _bootstrap_medians(values, reps, memory_limit):
+    '''
+    Description
+    -----------
+    Medians of bootstrap resamples of values, equal to
+    np.median(np.random.choice(values, (len(values), reps)), axis=0)
+    but with working memory bounded by memory_limit
+
+    Resamples are drawn as integer indices and mapped to ranks in the sorted
+    values. If the full index matrix fits in memory_limit the medians come
+    from np.partition of the ranks. Otherwise the same random stream is drawn
+    twice in row chunks: the first pass counts ranks per replicate in coarse
+    buckets to locate the buckets holding the middle order statistics, and
+    the second pass counts the exact ranks inside those buckets.
+
+    Parameters
+    ----------
+    values: numpy array of data type float, must not contain NaN
+    reps: int, number of bootstrap replicates
+    memory_limit: int, approximate working memory ceiling in bytes
+
+    Returns
+    -------
+    numpy array of the reps bootstrap medians
+    '''
+
+    n = len(values)
+    sorted_values, rank_of, kth = _median_ranks(values)
+
+    # bytes per resampled element: int64 indices, ranks and temporary keys
+    item_bytes = 6 * 8
+
+    if n * reps * item_bytes <= memory_limit:
+        idx = np.random.randint(0, n, size=(n, reps))
+        ranks = np.partition(rank_of[idx], kth, axis=0)
+        median_ranks = [ranks[k] for k in kth]
+    else:
+        rows = max(1, int(memory_limit // (reps * item_bytes)))
+        state = np.random.get_state()
+
+        def _chunked_ranks():
+            for start in range(0, n, rows):
+                stop = min(start + rows, n)
+                idx = np.random.randint(0, n, size=(stop - start, reps))
+                yield rank_of[idx]
+
+        columns = np.arange(reps)
+
+        # pass 1: per replicate counts of ranks in buckets of width bucket_size
+        bucket_size = int(np.ceil(np.sqrt(n)))
+        n_buckets = int(np.ceil(n / float(bucket_size)))
+        bucket_counts = np.zeros(reps * n_buckets, dtype=np.int64)
+        for ranks in _chunked_ranks():
+            keys = ranks // bucket_size + columns * n_buckets
+            bucket_counts += np.bincount(keys.ravel(), minlength=reps * n_buckets)
+        bucket_cumsum = np.cumsum(bucket_counts.reshape(reps, n_buckets), axis=1)
+
+        # bucket holding each order statistic and the number of ranks below it
+        buckets = [np.sum(bucket_cumsum <= k, axis=1) for k in kth]
+        below = [np.where(b > 0, bucket_cumsum[columns, np.maximum(b - 1, 0)], 0)
+                 for b in buckets]
+
+        # pass 2: replay the same draws and count exact ranks inside those buckets
+        np.random.set_state(state)
+        rank_counts = [np.zeros(reps * bucket_size, dtype=np.int64) for k in kth]
+        for ranks in _chunked_ranks():
+            for b, counts in zip(buckets, rank_counts):
+                offsets = ranks - b * bucket_size
+                in_bucket = (offsets >= 0) & (offsets < bucket_size)
+                keys = (offsets + columns * bucket_size)[in_bucket]
+                counts += np.bincount(keys, minlength=reps * bucket_size)
+
+        median_ranks = []
+        for k, b, n_below, counts in zip(kth, buckets, below, rank_counts):
+            rank_cumsum = n_below[:, np.newaxis] + np.cumsum(counts.reshape(reps, bucket_size),
+                                                             axis=1)
+            median_ranks.append(b * bucket_size + np.sum(rank_cumsum <= k, axis=1))
+
+    return _median_from_ranks(sorted_values, median_ranks)
+
+
+def _seeded_bootstrap_medians(values, reps, random_state, workers=1):
+    '''
+    Description
+    -----------
+    Medians of bootstrap resamples of values, drawn in blocks of
+    _BOOTSTRAP_BLOCK replicates. Each block uses its own Generator on a
+    child of the SeedSequence from random_state, so blocks can run on a
+    thread pool and the result does not depend on the number of workers.
+
+    Parameters
+    ----------
+    values: numpy array of data type float, must not contain NaN
+    reps: int, number of bootstrap replicates
+    random_state: int, numpy SeedSequence or numpy Generator
+    workers: int, number of threads
+
+    Returns
+    -------
+    numpy array of the reps bootstrap medians
+    '''
+
+    n = len(values)
+    sorted_values, rank_of, kth = _median_ranks(values)
+
+    block_sizes = [min(_BOOTSTRAP_BLOCK, reps - start) for start in range(0, reps, _BOOTSTRAP_BLOCK)]
+    seeds = _seed_sequence(random_state).spawn(len(block_sizes))
+
+    def _block_medians(args):
+        size, seed = args
+        idx = _generator(seed).integers(0, n, size=(size, n))
+        ranks = np.partition(rank_of[idx], kth, axis=1)
+        return _median_from_ranks(sorted_values, [ranks[:, k] for k in kth])
+
+    blocks = list(zip(block_sizes, seeds))
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            medians = pool.map(_block_medians, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        medians = [_block_medians(block) for block in blocks]
+
+    return np.concatenate(medians)
+
+
+def _median_ranks(values):
+    '''
+    Description
+    -----------
+    Sort values and map each index to its rank, so that medians of integer
+    index resamples can be selected on integer ranks
+
+    Parameters
+    ----------
+    values: numpy array of data type float, must not contain NaN
+
+    Returns
+    -------
+    tuple of (sorted_values, rank_of, kth)
+        sorted_values: numpy array of values in ascending order
+        rank_of: numpy int64 array, position of each value in sorted_values
+        kth: list of the one or two order statistics averaged by np.median
+    '''
+
+    n = len(values)
+    order = np.argsort(values, kind='mergesort')
+    sorted_values = values[order]
+    rank_of = np.empty(n, dtype=np.int64)
+    rank_of[order] = np.arange(n)
+    kth = sorted(set([(n - 1) // 2, n // 2]))
+    return sorted_values, rank_of, kth
+
+
+def _median_from_ranks(sorted_values, median_ranks):
+    '''Median values from the ranks of the order statistics given by _median_ranks'''
+    if len(median_ranks) == 1:
+        return sorted_values[median_ranks[0]]
+    else:
+        return (sorted_values[median_ranks[0]] + sorted_values[median_ranks[1]]) / 2.0
+
+
+def _seed_sequence(random_state):
+    '''
+    Description
+    -----------
+    SeedSequence from an int, SeedSequence or Generator random_state.
+    A Generator is advanced by the draw of the child entropy. A SeedSequence
+    is copied, so spawning children does not change it and passing the same
+    object again gives the same draws.
+    '''
+
+    if not hasattr(np.random, 'SeedSequence'):
+        raise ImportError('random_state requires numpy >= 1.17')
+
+    if isinstance(random_state, np.random.SeedSequence):
+        return np.random.SeedSequence(random_state.entropy, spawn_key=random_state.spawn_key,
+                                      pool_size=random_state.pool_size,
+                                      n_children_spawned=random_state.n_children_spawned)
+    elif isinstance(random_state, np.random.Generator):
+        return np.random.SeedSequence(random_state.integers(0, 2**63, size=4).tolist())
+    else:
+        return np.random.SeedSequence(random_state)
+
+
+def _generator(random_state):
+    '''Numpy Generator from an int, SeedSequence or Generator random_state'''
+
+    if hasattr(np.random, 'Generator') and isinstance(random_state, np.random.Generator):
+        return random_state
+    return np.random.Generator(np.random.PCG64(_seed_sequence(random_state)))
 
 
 def _mk_test(x, alpha=0.05):
@@ -287,16 +1282,14 @@ def _mk_test(x, alpha=0.05):
 
     from scipy.stats import norm
 
+    x = np.asarray(x)
     n = len(x)
 
     # calculate S
-    s = 0
-    for k in range(n - 1):
-        for j in range(k + 1, n):
-            s += np.sign(x[j] - x[k])
+    s = _mk_score(x)
 
     # calculate the unique data
-    unique_x = np.unique(x)
+    unique_x, tp = np.unique(x, return_counts=True)
     g = len(unique_x)
 
     # calculate the var(s)
@@ -305,9 +1298,7 @@ def _mk_test(x, alpha=0.05):
         var_s = (n * (n - 1) * (2 * n + 5)) / 18
     else:
         # there are some ties in data
-        tp = np.zeros(unique_x.shape)
-        for i in range(len(unique_x)):
-            tp[i] = sum(unique_x[i] == x)
+        tp = tp.astype(float)
         var_s = (n * (n - 1) * (2 * n + 5) +
                  np.sum(tp * (tp - 1) * (2 * tp + 5))) / 18
 
@@ -332,17 +1323,79 @@ def _mk_test(x, alpha=0.05):
     return trend, h, p, z
 
 
-def _degradation_CI(results, confidence_level):
+def _mk_score(x):
     '''
     Description
     -----------
-    Monte Carlo estimation of uncertainty in degradation rate from OLS results
+    Mann-Kendall S statistic, sum(sign(x[j] - x[k])) over all pairs k < j,
+    computed in O(n log^2 n) with a vectorized bottom-up merge count of
+    discordant pairs (Knight's algorithm) instead of the O(n^2) pair loop
+
+    Parameters
+    ----------
+    x: numpy array of data type float, must not contain NaN
+
+    Returns
+    -------
+    s: int, Mann-Kendall S statistic
+    '''
+
+    n = len(x)
+    if n < 2:
+        return 0
+
+    # dense integer ranks keep ties equal and make keys exact
+    unique_x, rank, counts = np.unique(x, return_inverse=True, return_counts=True)
+    rank = rank.astype(np.int64)
+    n_ranks = len(unique_x)
+
+    # S = concordant - discordant = total pairs - tied pairs - 2 * discordant
+    n_pairs = n * (n - 1) // 2
+    n_tied = int(np.sum(counts * (counts - 1) // 2))
+
+    # Bottom-up merge: at each level, blocks of width w are sorted and paired
+    # (left, right). For every element of a right block, count the elements of
+    # its left block with strictly greater rank. Offsetting ranks by the pair
+    # number lets a single searchsorted handle all pairs of a level at once.
+    positions = np.arange(n)
+    discordant = 0
+    width = 1
+    while width < n:
+        pair = positions // (2 * width)
+        is_left = (positions // width) % 2 == 0
+        keys = pair * n_ranks + rank
+
+        left_keys = keys[is_left]
+        right_keys = keys[~is_left]
+        right_pair = pair[~is_left]
+
+        # index just past the end of each pair's left block in left_keys
+        left_end = np.searchsorted(left_keys, (right_pair + 1) * n_ranks, side='left')
+        not_greater = np.searchsorted(left_keys, right_keys, side='right')
+        discordant += int(np.sum(left_end - not_greater))
+
+        # merge each pair into a sorted block of width 2 * width
+        rank = np.sort(keys) - pair * n_ranks
+        width *= 2
+
+    return n_pairs - n_tied - 2 * discordant
+
+
+def _degradation_CI(results, confidence_level, random_state=None, method='monte_carlo'):
+    '''
+    Description
+    -----------
+    Estimation of uncertainty in degradation rate from OLS results
 
     Parameters
     ----------
     results: OLSResults object from fitting a model of the form:
         results = sm.OLS(endog = df.energy_ma, exog = df.loc[:,['const','years']]).fit()
     confidence_level: the size of the confidence interval to return, in percent
+    random_state: None, int, numpy SeedSequence or numpy Generator, default None
+        None draws from the global numpy random state. Ignored unless
+        method is 'monte_carlo'.
+    method: str, 'monte_carlo' (default), 'delta' or 'fieller'
 
     Returns
     -------
@@ -350,8 +1403,82 @@ def _degradation_CI(results, confidence_level):
 
     '''
 
-    sampled_normal = np.random.multivariate_normal(results.params, results.cov_params(), 10000)
-    dist = sampled_normal[:, 1] / sampled_normal[:, 0]
-    half_ci = confidence_level / 2.0
-    Rd_CI = np.percentile(dist, [50.0 - half_ci, 50.0 + half_ci]) * 100.0
-    return Rd_CI
+    if method == 'monte_carlo':
+        if random_state is None:
+            multivariate_normal = np.random.multivariate_normal
+        else:
+            multivariate_normal = _generator(random_state).multivariate_normal
+
+        sampled_normal = multivariate_normal(results.params, results.cov_params(), 10000)
+        dist = sampled_normal[:, 1] / sampled_normal[:, 0]
+        half_ci = confidence_level / 2.0
+        Rd_CI = np.percentile(dist, [50.0 - half_ci, 50.0 + half_ci]) * 100.0
+        return Rd_CI
+
+    elif method in ('delta', 'fieller'):
+        b, m = np.asarray(results.params)
+        cov = np.asarray(results.cov_params())
+        return _ratio_CI(b, m, cov[0, 0], cov[1, 1], cov[0, 1], confidence_level, method)
+
+    else:
+        raise ValueError('Invalid ci_method')
+
+
+def _ratio_CI(b, m, var_b, var_m, cov_bm, confidence_level, method):
+    '''
+    Description
+    -----------
+    Closed form confidence interval of the degradation rate 100 * m / b from
+    the estimates and covariance of intercept b and slope m. Inputs may be
+    scalars or arrays of equal shape.
+
+    'delta' propagates the variance to first order:
+        var(m / b) = (var_m - 2 r cov_bm + r**2 var_b) / b**2, r = m / b
+    'fieller' solves (m - r b)**2 = z**2 (var_m - 2 r cov_bm + r**2 var_b)
+    for r. If b is not significantly different from zero the Fieller
+    interval is unbounded and (-inf, inf) is returned. Both methods return
+    NaN bounds where any input is not finite.
+
+    Parameters
+    ----------
+    b, m: intercept and slope estimates
+    var_b, var_m, cov_bm: variances and covariance of b and m
+    confidence_level: the size of the confidence interval to return, in percent
+    method: str, 'delta' or 'fieller'
+
+    Returns
+    -------
+    numpy array of (lower, upper) bounds in %/yr, stacked on the first axis
+    '''
+
+    from scipy.stats import norm
+
+    z = norm.ppf(0.5 + confidence_level / 200.0)
+
+    if method == 'delta':
+        ratio = m / b
+        se = np.sqrt(var_m - 2.0 * ratio * cov_bm + ratio ** 2 * var_b) / np.abs(b)
+        lower = ratio - z * se
+        upper = ratio + z * se
+
+    elif method == 'fieller':
+        z2 = z ** 2
+        qa = b ** 2 - z2 * var_b
+        qb = -2.0 * (m * b - z2 * cov_bm)
+        qc = m ** 2 - z2 * var_m
+        discriminant = qb ** 2 - 4.0 * qa * qc
+        bounded = (qa > 0) & (discriminant >= 0)
+        finite = (np.isfinite(b) & np.isfinite(m) & np.isfinite(var_b) & np.isfinite(var_m) &
+                  np.isfinite(cov_bm))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            root = np.sqrt(np.where(bounded, discriminant, 0.0))
+            lower = np.where(bounded, (-qb - root) / (2.0 * qa), -np.inf)
+            upper = np.where(bounded, (-qb + root) / (2.0 * qa), np.inf)
+        lower = np.where(finite, lower, np.nan)
+        upper = np.where(finite, upper, np.nan)
+
+    else:
+        raise ValueError('Invalid ci_method')
+
+    return np.array([lower, upper]) * 100.0
@@ -9,13 +9,28 @@ import pvlib
 import numpy as np
 from scipy.optimize import minimize
 import warnings
+import threading
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+
+# Frequencies inferred by check_series_frequency, see set_frequency_cache
+_frequency_cache = None
+_frequency_cache_size = 0
+_frequency_cache_lock = threading.Lock()
+
+# Solar positions computed by sapm_dc_power, see set_solar_position_cache
+_solar_position_cache = None
 
 
 class ConvergenceError(Exception):
     pass
 
 
-def pvwatts_dc_power(poa_global, P_ref, T_cell=None, G_ref=1000, T_ref=25, gamma_pdc=None):
+def pvwatts_dc_power(poa_global, P_ref, T_cell=None, G_ref=1000, T_ref=25, gamma_pdc=None,
+                     dtype=None):
     '''
     PVWatts v5 Module Model: DC power given effective poa poa_global, module
     nameplate power, and cell temperature. This function differs from the PVLIB
@@ -39,6 +54,9 @@ def pvwatts_dc_power(poa_global, P_ref, T_cell=None, G_ref=1000, T_ref=25, gamma
         Reference temperature at standard test condition [degrees celsius].
     gamma_pdc: numeric, default is None
         Linear array efficiency temperature coefficient [1 / degree celsius].
+    dtype: numpy float dtype, default None
+        Floating point type to compute in, e.g. np.float32 to halve memory use
+        of high frequency data. Inputs are used as given if omitted.
 
     Note: All series are assumed to be right-labeled, meaning that the recorded value
           at a given timestamp refers ot the previous time interval
@@ -49,6 +67,10 @@ def pvwatts_dc_power(poa_global, P_ref, T_cell=None, G_ref=1000, T_ref=25, gamma
         DC power in watts determined by PVWatts v5 equation.
     '''
 
+    if dtype is not None:
+        poa_global, P_ref, T_cell, G_ref, T_ref, gamma_pdc = [
+            _astype(value, dtype) for value in (poa_global, P_ref, T_cell, G_ref, T_ref, gamma_pdc)]
+
     dc_power = P_ref * poa_global / G_ref
 
     if T_cell is not None and gamma_pdc is not None:
@@ -58,7 +80,16 @@ def pvwatts_dc_power(poa_global, P_ref, T_cell=None, G_ref=1000, T_ref=25, gamma
     return dc_power
 
 
-def normalize_with_pvwatts(energy, pvwatts_kws):
+def _astype(value, dtype):
+    '''Casts a Series, array or scalar to dtype, None is passed through'''
+    if value is None:
+        return None
+    if hasattr(value, 'astype'):
+        return value.astype(dtype, copy=False)
+    return np.dtype(dtype).type(value)
+
+
+def normalize_with_pvwatts(energy, pvwatts_kws, mapping=None, dtype=None):
     '''
     Normalize system AC energy output given measured poa_global and
     meteorological data. This method uses the PVWatts V5 module model.
@@ -88,6 +119,14 @@ def normalize_with_pvwatts(energy, pvwatts_kws):
             Reference temperature at standard test condition [degrees celsius].
         gamma_pdc: numeric, default is None
             Linear array efficiency temperature coefficient [1 / degree celsius].
+    mapping: ResampleMapping, default None
+        Precomputed mapping of the model time index onto energy.index, which
+        can be reused for systems that share the same met data timestamps.
+        Computed from the data if omitted.
+    dtype: numpy float dtype, default None
+        Floating point type to compute in, e.g. np.float32 to halve memory use
+        of high frequency data. Resampled sums are still accumulated in
+        float64. Inputs are used as given if omitted.
     Note: All series are assumed to be right-labeled, meaning that the recorded value
           at a given timestamp refers ot the previous time interval
 
@@ -100,36 +139,118 @@ def normalize_with_pvwatts(energy, pvwatts_kws):
             Insolation associated with each normalized point
     '''
 
-    freq = check_series_frequency(energy, 'energy')
-
-    dc_power = pvwatts_dc_power(**pvwatts_kws)
     irrad = pvwatts_kws['poa_global']
+    model_series = [value for value in pvwatts_kws.values() if isinstance(value, pd.Series)]
+
+    if not all(series.index.equals(irrad.index) for series in model_series):
+        # Model inputs on different indexes are aligned by pandas first
+        dc_power = pvwatts_dc_power(dtype=dtype, **pvwatts_kws)
+        energy_dc, insolation = _model_energy(energy, dc_power, irrad, mapping, dtype)
+        if dtype is not None:
+            energy = energy.astype(dtype, copy=False)
+        return energy / energy_dc, insolation
+
+    if mapping is None:
+        freq = check_series_frequency(energy, 'energy')
+        mapping = ResampleMapping(irrad.index, energy.index, freq)
+    elif not mapping.matches(irrad.index, energy.index):
+        raise ValueError('mapping was not computed for the model and energy time indexes')
+
+    kws = dict((key, value.values if isinstance(value, pd.Series) else value)
+               for key, value in pvwatts_kws.items())
+    normalized_energy, insolation = _normalize_pvwatts_arrays(energy.values, mapping, dtype, **kws)
+
+    # Names follow from the pandas arithmetic of the model and energy
+    names = set(series.name for series in model_series)
+    dc_name = names.pop() if len(names) == 1 else None
+    normalized_energy = pd.Series(normalized_energy, index=energy.index,
+                                  name=energy.name if energy.name == dc_name else None)
+    insolation = pd.Series(insolation, index=energy.index, name=irrad.name)
 
-    model_tds, mean_model_td = delta_index(dc_power)
-    irrad_tds, mean_irrad_td = delta_index(irrad)
-    measure_tds, mean_measure_td = delta_index(energy)
+    return normalized_energy, insolation
 
-    if mean_model_td <= mean_measure_td:
-        energy_dc = dc_power * model_tds
-        energy_dc = energy_dc.resample(freq).sum()
-        energy_dc = energy_dc.reindex(energy.index, method='nearest')
 
-        insolation = irrad * irrad_tds
-        insolation = insolation.resample(freq).sum()
-        insolation = insolation.reindex(energy.index, method='nearest')
+def normalize_with_pvwatts_arrays(times, energy, poa_global, P_ref, T_cell=None, G_ref=1000,
+                                  T_ref=25, gamma_pdc=None, model_times=None, freq=None,
+                                  model_freq=None, mapping=None, dtype=None):
+    '''
+    normalize_with_pvwatts for numpy arrays, avoiding the overhead of pandas
+    objects. The input arrays are not copied or modified.
 
-    elif mean_model_td > mean_measure_td:
-        dc_power = dc_power.resample(freq).asfreq()
-        dc_power = dc_power.interpolate()
-        dc_power = dc_power.reindex(energy.index, method='nearest')
-        energy_dc = dc_power * measure_tds  # timedelta is that of measurment due to reindex
+    Timestamps carry no frequency information. As for a Pandas Series
+    without a frequency, the first time step size is unknown unless freq and
+    model_freq are given, or a mapping computed from time indexes with
+    frequency information. Otherwise the first model point adds no energy and
+    the first normalized point is not meaningful (inf or NaN).
 
-        irrad = irrad.resample(freq).asfreq()
-        irrad = irrad.interpolate()
-        irrad = irrad.reindex(energy.index, method='nearest')
-        insolation = irrad * measure_tds  # timedelta is that of measurment due to reindex
+    Parameters
+    ----------
+    times: numpy array (int64)
+        Timestamps of energy in nanoseconds since the epoch.
+        Must be a right-labeled regular time series.
+    energy: numpy array (numeric)
+        Energy to be normalized in watt hours.
+    poa_global: numpy array (numeric)
+        Total effective plane of array irradiance at model_times.
+    P_ref: numeric
+        Rated DC power of array in watts.
+    T_cell: numpy array (numeric), default None
+        Measured or derived cell temperature at model_times [degrees celsius].
+    G_ref: numeric, default value is 1000
+        Reference irradiance at standard test condition [W/m**2].
+    T_ref: numeric, default value is 25
+        Reference temperature at standard test condition [degrees celsius].
+    gamma_pdc: numeric, default is None
+        Linear array efficiency temperature coefficient [1 / degree celsius].
+    model_times: numpy array (int64), default None
+        Timestamps of poa_global and T_cell in nanoseconds since the epoch,
+        the same as times if omitted.
+    freq: str or Pandas DateOffset, default None
+        Frequency of times, which also gives the size of the first time step.
+        Inferred if omitted.
+    model_freq: str or Pandas DateOffset, default None
+        Frequency of model_times, giving the size of the first model time
+        step. freq is used if model_times is omitted.
+    mapping: ResampleMapping, default None
+        Precomputed mapping of model_times onto times, computed if omitted.
+    dtype: numpy float dtype, default None
+        Floating point type to compute in, see normalize_with_pvwatts.
 
-    normalized_energy = energy / energy_dc
+    Returns
+    -------
+    tulple (normalized_energy, insolation)
+        normalized_energy: numpy array (numeric)
+            Energy divided by PVWatts DC energy.
+        insolation: numpy array (numeric)
+            Insolation associated with each normalized point
+    '''
+
+    times = _as_index(times, freq)
+    if model_times is None:
+        model_times = times
+    else:
+        model_times = _as_index(model_times, model_freq)
+    if mapping is None:
+        mapping = ResampleMapping(model_times, times, freq)
+    elif not mapping.matches(model_times, times):
+        raise ValueError('mapping was not computed for model_times and times')
+
+    return _normalize_pvwatts_arrays(energy, mapping, dtype, poa_global, P_ref, T_cell,
+                                     G_ref, T_ref, gamma_pdc)
+
+
+def _normalize_pvwatts_arrays(energy, mapping, dtype, poa_global, P_ref, T_cell=None,
+                              G_ref=1000, T_ref=25, gamma_pdc=None):
+    '''Returns normalized energy and insolation arrays, the core of normalize_with_pvwatts'''
+
+    dc_power = pvwatts_dc_power(poa_global, P_ref, T_cell, G_ref, T_ref, gamma_pdc, dtype=dtype)
+    energy_dc, insolation = mapping._integrate([dc_power, poa_global], dtype).T
+
+    energy = np.asarray(energy)
+    if dtype is not None:
+        energy = energy.astype(dtype, copy=False)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized_energy = energy / energy_dc
 
     return normalized_energy, insolation
 
@@ -162,7 +283,94 @@ def sapm_dc_power(pvlib_pvsystem, met_data):
             Effective irradiance calculated with SAPM
     '''
 
-    solar_position = pvlib_pvsystem.get_solarposition(met_data.index)
+    geometry = _sapm_geometry(pvlib_pvsystem, met_data)
+    return _sapm_module(pvlib_pvsystem, met_data, geometry)
+
+
+def sapm_dc_power_fleet(pvlib_pvsystems, met_data):
+    '''
+    sapm_dc_power for many systems sharing the same met data. Systems are
+    grouped by location and orientation, and solar position, transposition,
+    angle of incidence and airmass are computed once per group. Only the
+    module specific effective irradiance, cell temperature and DC power are
+    computed for each system.
+
+    Parameters
+    ----------
+    pvlib_pvsystems: list of pvlib-python LocalizedPVSystem objects
+        Systems to model, see sapm_dc_power.
+    met_data: Pandas DataFrame (numeric)
+        Measured irradiance components, ambient temperature, and wind speed.
+        Expected met_data DataFrame column names:
+            ['DNI', 'GHI', 'DHI', 'Temperature', 'Wind Speed']
+
+    Returns
+    -------
+    list of tuples (dc_power, effective_poa)
+        sapm_dc_power results in the order of pvlib_pvsystems
+    '''
+
+    geometries = {}
+    results = []
+    for pvlib_pvsystem in pvlib_pvsystems:
+        key = _geometry_key(pvlib_pvsystem)
+        if key not in geometries:
+            geometries[key] = _sapm_geometry(pvlib_pvsystem, met_data)
+        results.append(_sapm_module(pvlib_pvsystem, met_data, geometries[key]))
+    return results
+
+
+def normalize_with_sapm_fleet(energies, pvlib_pvsystems, met_data):
+    '''
+    normalize_with_sapm for many systems sharing the same met data, using
+    sapm_dc_power_fleet for the modeling. The alignment of the model data with
+    energy is computed once for systems whose energy shares an index.
+
+    Parameters
+    ----------
+    energies: list of Pandas Series (numeric)
+        Energy time series of each system to be normalized in watt hours.
+        Must be right-labeled regular time series.
+    pvlib_pvsystems: list of pvlib-python LocalizedPVSystem objects
+        Systems to model, in the order of energies, see sapm_dc_power.
+    met_data: Pandas DataFrame (numeric)
+        Measured met_data, ambient temperature, and wind speed.
+
+    Returns
+    -------
+    list of tuples (normalized_energy, insolation)
+        normalize_with_sapm results in the order of energies
+    '''
+
+    if len(energies) != len(pvlib_pvsystems):
+        raise ValueError('energies and pvlib_pvsystems must have the same length')
+
+    mapping = None
+    results = []
+    models = sapm_dc_power_fleet(pvlib_pvsystems, met_data)
+    for energy, (dc_power, irrad) in zip(energies, models):
+        if mapping is None or not mapping.matches(dc_power.index, energy.index):
+            freq = check_series_frequency(energy, 'energy')
+            mapping = ResampleMapping(dc_power.index, energy.index, freq)
+        energy_dc, insolation = _model_energy(energy, dc_power, irrad, mapping)
+        results.append((energy / energy_dc, insolation))
+    return results
+
+
+def _geometry_key(pvlib_pvsystem):
+    '''Location and orientation attributes that determine _sapm_geometry'''
+    return tuple(getattr(pvlib_pvsystem, name, None)
+                 for name in ('latitude', 'longitude', 'altitude', 'surface_tilt',
+                              'surface_azimuth', 'albedo'))
+
+
+def _sapm_geometry(pvlib_pvsystem, met_data):
+    '''
+    Returns (total_irradiance, aoi, airmass_absolute), the parts of
+    sapm_dc_power that depend only on location and orientation
+    '''
+
+    solar_position = _solar_position(pvlib_pvsystem, met_data.index)
 
     total_irradiance = pvlib_pvsystem\
         .get_irradiance(solar_position['zenith'],
@@ -178,6 +386,14 @@ def sapm_dc_power(pvlib_pvsystem, met_data):
         .get_airmass(solar_position=solar_position, model='kastenyoung1989')
     airmass_absolute = airmass['airmass_absolute']
 
+    return total_irradiance, aoi, airmass_absolute
+
+
+def _sapm_module(pvlib_pvsystem, met_data, geometry):
+    '''Returns (dc_power, effective_poa) of sapm_dc_power from the output of _sapm_geometry'''
+
+    total_irradiance, aoi, airmass_absolute = geometry
+
     effective_poa = pvlib.pvsystem\
         .sapm_effective_irradiance(poa_direct=total_irradiance['poa_direct'],
                                    poa_diffuse=total_irradiance['poa_diffuse'],
@@ -198,7 +414,152 @@ def sapm_dc_power(pvlib_pvsystem, met_data):
     return dc_power, effective_poa
 
 
-def normalize_with_sapm(energy, sapm_kws):
+def _solar_position(pvlib_pvsystem, times):
+    '''pvlib_pvsystem.get_solarposition(times), using the solar position cache if enabled'''
+
+    cache = _solar_position_cache
+    if cache is None:
+        return pvlib_pvsystem.get_solarposition(times)
+
+    key = (pvlib_pvsystem.latitude, pvlib_pvsystem.longitude, pvlib_pvsystem.altitude,
+           str(times.tz), hashlib.sha1(times.asi8.tobytes()).hexdigest())
+    cached = cache.get(key)
+    if cached is not None:
+        columns, values = cached
+        return pd.DataFrame(values, index=times, columns=columns)
+
+    solar_position = pvlib_pvsystem.get_solarposition(times)
+    cache.put(key, list(solar_position.columns), solar_position.values)
+    return solar_position
+
+
+class _SolarPositionCache(object):
+    '''
+    Least recently used cache of solar position arrays, held in memory up to
+    max_bytes and optionally stored as .npz files in directory up to
+    max_disk_bytes
+    '''
+
+    def __init__(self, max_bytes, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                entry = self._entries.pop(key)
+                self._entries[key] = entry
+                return entry
+
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                columns, values = list(data['columns']), data['values']
+            os.utime(path, None)  # mark as recently used for eviction
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+        self._remember(key, columns, values)
+        return columns, values
+
+    def put(self, key, columns, values):
+        values = self._remember(key, columns, values)
+        if self.directory is None:
+            return
+
+        # Write to a temporary file first so readers never see a partial file
+        handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, columns=np.array(columns), values=values)
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            os.rename(temp_path, self._path(key))
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict_files()
+
+    def _remember(self, key, columns, values):
+        values = np.array(values, dtype=float)
+        values.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1].nbytes
+            if values.nbytes <= self.max_bytes:
+                self._entries[key] = (columns, values)
+                self._bytes += values.nbytes
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._entries.popitem(last=False)[1][1].nbytes
+        return values
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'solar_position_' + name + '.npz')
+
+    def _evict_files(self):
+        if self.max_disk_bytes is None:
+            return
+        files = []
+        for name in os.listdir(self.directory):
+            if name.startswith('solar_position_') and name.endswith('.npz'):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    pass
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+def set_solar_position_cache(max_bytes=2**28, directory=None, max_disk_bytes=2**30):
+    '''
+    Enables or disables caching of the solar positions computed by
+    sapm_dc_power, so that repeated SAPM normalizations of a site over the
+    same time index skip the solar position calculation.
+
+    Solar positions are cached by the latitude, longitude and altitude of the
+    system and the timestamps and time zone of the met data index. The least
+    recently used entries are evicted when a size limit is exceeded.
+
+    Parameters
+    ----------
+    max_bytes: int, default 2**28
+        Maximum size of the solar positions held in memory, in bytes. 0 or
+        None disables and clears the cache.
+    directory: str, default None
+        Directory to also store solar positions in as .npz files, so they can
+        be reused by other processes and sessions. Only kept in memory if
+        omitted.
+    max_disk_bytes: int, default 2**30
+        Maximum total size of the .npz files in directory, in bytes. None for
+        no limit.
+    '''
+
+    global _solar_position_cache
+
+    if not max_bytes:
+        _solar_position_cache = None
+        return
+    if directory is not None and not os.path.isdir(directory):
+        os.makedirs(directory)
+    _solar_position_cache = _SolarPositionCache(max_bytes, directory, max_disk_bytes)
+
+
+def normalize_with_sapm(energy, sapm_kws, mapping=None):
     '''
     Normalize system AC energy output given measured met_data and
     meteorological data. This method relies on the Sandia Array Performance
@@ -222,6 +583,10 @@ def normalize_with_sapm(energy, sapm_kws):
             constants.
         met_data: Pandas DataFrame (numeric)
             Measured met_data, ambient temperature, and wind speed.
+    mapping: ResampleMapping, default None
+        Precomputed mapping of the model time index onto energy.index, which
+        can be reused for systems that share the same met data timestamps.
+        Computed from the data if omitted.
     Note: All series are assumed to be right-labeled, meaning that the recorded value
           at a given timestamp refers ot the previous time interval
     Returns
@@ -233,37 +598,489 @@ def normalize_with_sapm(energy, sapm_kws):
             Insolation associated with each normalized point
     '''
 
-    freq = check_series_frequency(energy, 'energy')
-
     dc_power, irrad = sapm_dc_power(**sapm_kws)
 
-    model_tds, mean_model_td = delta_index(dc_power)
-    irrad_tds, mean_irrad_td = delta_index(irrad)
-    measure_tds, mean_measure_td = delta_index(energy)
+    energy_dc, insolation = _model_energy(energy, dc_power, irrad, mapping)
 
-    if mean_model_td <= mean_measure_td:
-        energy_dc = dc_power * model_tds
-        energy_dc = energy_dc.resample(freq).sum()
-        energy_dc = energy_dc.reindex(energy.index, method='nearest')
+    normalized_energy = energy / energy_dc
 
-        insolation = irrad * irrad_tds
-        insolation = insolation.resample(freq).sum()
-        insolation = insolation.reindex(energy.index, method='nearest')
+    return normalized_energy, insolation
 
-    elif mean_model_td > mean_measure_td:
-        dc_power = dc_power.resample(freq).asfreq()
-        dc_power = dc_power.interpolate()
-        dc_power = dc_power.reindex(energy.index, method='nearest')
-        energy_dc = dc_power * measure_tds  # timedelta is that of measurment due to reindex
 
-        irrad = irrad.resample(freq).asfreq()
-        irrad = irrad.interpolate()
-        irrad = irrad.reindex(energy.index, method='nearest')
-        insolation = irrad * measure_tds  # timedelta is that of measurment due to reindex
+class ResampleMapping(object):
+    '''
+    Mapping of a model time index onto the regular time index of measured
+    energy, used by normalize_with_pvwatts and normalize_with_sapm to align
+    modeled power and irradiance with energy. The mapping depends only on the
+    two indexes, so it can be computed once and reused for many systems that
+    share the same met data timestamps.
+
+    If the model time steps are on average no longer than the energy time
+    steps, modeled energy is summed into the energy interval containing each
+    model timestamp. Otherwise modeled power is linearly interpolated to the
+    energy timestamps and multiplied by the energy interval lengths.
+
+    The summing intervals are anchored on the energy timestamps, from each
+    timestamp to the next one (or, for period end frequencies such as 'M' and
+    'W', from the previous timestamp to each one). Energy timestamps that are
+    off the frequency grid, e.g. hourly at :30, therefore sum the model data
+    in [:30, :30 + 1 hour). The resampling previously used for downsampling
+    binned on the frequency grid and took the nearest bin, so results differ
+    for such indexes.
+
+    Model timestamps do not need to fall on the energy time index: power is
+    interpolated between the model timestamps around each energy timestamp,
+    and held at the first or last model value outside the model time range.
+    The resampling previously used for upsampling returned NaN in that case,
+    as it kept only the model timestamps on the energy index.
 
-    normalized_energy = energy / energy_dc
+    Parameters
+    ----------
+    source_index: Pandas DatetimeIndex or numpy array (int64)
+        Time index of the modeled power and irradiance, or its timestamps in
+        nanoseconds since the epoch.
+    target_index: Pandas DatetimeIndex or numpy array (int64)
+        Time index of the energy, must be a regular time series, or its
+        timestamps in nanoseconds since the epoch.
+    freq: str or Pandas DateOffset, default None
+        Frequency of target_index, inferred if omitted.
+    downsample: bool, default None
+        Whether to sum model energy into the target intervals (True) or to
+        interpolate model power (False). Chosen from the mean time step sizes
+        if omitted.
+    '''
 
-    return normalized_energy, insolation
+    def __init__(self, source_index, target_index, freq=None, downsample=None):
+        source_index = _as_index(source_index)
+        target_index = _as_index(target_index)
+        if freq is None:
+            freq = _index_frequency(target_index, 'target_index')
+        freq = pd.tseries.frequencies.to_offset(freq)
+
+        source_tds = _delta_hours(source_index)
+        target_tds = _delta_hours(target_index)
+        if downsample is None:
+            downsample = (np.mean(source_tds[~np.isnan(source_tds)]) <=
+                          np.mean(target_tds[~np.isnan(target_tds)]))
+
+        self.source_index = source_index
+        self.target_index = target_index
+        self.freq = freq
+        self.downsample = downsample
+
+        # Work on int64 nanosecond timestamps with the model data in time order
+        source = source_index.asi8
+        target = target_index.asi8
+        self._order = None
+        if not source_index.is_monotonic_increasing:
+            self._order = np.argsort(source, kind='mergesort')
+            source = source[self._order]
+            source_tds = source_tds[self._order]
+
+        if downsample:
+            self._source_tds = source_tds[:, np.newaxis]
+            self._sum_mapping(source, target)
+        else:
+            self._target_tds = target_tds[:, np.newaxis]
+            self._interpolation_mapping(source, target)
+
+    def _sum_mapping(self, source, target):
+        # Resampling intervals are labeled by their left edge, except for the
+        # period end frequencies, which pandas labels and closes on the right
+        n_target = len(target)
+        if _right_closed(self.freq):
+            edges = self.target_index[:1] - self.freq
+            edges = edges.append(self.target_index)
+            if not isinstance(self.freq, pd.tseries.offsets.Tick):
+                # pandas extends these intervals to the end of the labeled day
+                tz = edges.tz
+                edges = edges.tz_localize(None) + pd.Timedelta(days=1) - pd.Timedelta(1)
+                edges = edges.tz_localize(tz)
+            bins = np.searchsorted(edges.asi8, source, side='left') - 1
+        else:
+            edges = np.append(target, (self.target_index[-1:] + self.freq).asi8)
+            bins = np.searchsorted(edges, source, side='right') - 1
+
+        # bins is sorted, so the model points inside the energy intervals are
+        # a contiguous block and each interval is a contiguous run of it
+        start, stop = np.searchsorted(bins, [0, n_target])
+        bins = bins[start:stop]
+        self._block = slice(start, stop)
+        self._offsets = np.searchsorted(bins, np.arange(n_target))
+        self._empty = np.bincount(bins, minlength=n_target) == 0
+        self._populated = np.flatnonzero(~self._empty)
+        self._starts = self._offsets[self._populated]
+
+        # Energy timestamps outside the model data take the nearest populated
+        # interval, as reindexing the resampled model data with method='nearest'
+        if len(bins):
+            self._take = np.arange(n_target).clip(bins[0], bins[-1])
+        else:
+            self._take = None
+
+    def _interpolation_mapping(self, source, target):
+        self._source = source
+        if len(source) < 2:
+            self._lower = self._upper = np.zeros(len(target), dtype=int)
+            self._weight = np.zeros((len(target), 1))
+            return
+        upper = np.searchsorted(source, target, side='right').clip(1, len(source) - 1)
+        lower = upper - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = (target - source[lower]) / (source[upper] - source[lower]).astype(float)
+        self._lower = lower
+        self._upper = upper
+        self._weight = weight.clip(0, 1)[:, np.newaxis]
+
+    def matches(self, source_index, target_index):
+        '''
+        Returns True if the mapping was computed for source_index and
+        target_index, which are compared by timestamp only if given as arrays
+        '''
+        return (_same_times(self.source_index, source_index) and
+                _same_times(self.target_index, target_index))
+
+    def integrate(self, *series, **kwargs):
+        '''
+        Converts power time series on the source index to energy on the target
+        index, all series in a single pass.
+
+        Parameters
+        ----------
+        series: Pandas Series (numeric)
+            Power or irradiance time series on the source index.
+        dtype: numpy float dtype, default None
+            Floating point type of the computation and results, float64 if
+            omitted. Sums over intervals accumulate in float64.
+
+        Returns
+        -------
+        list of Pandas Series (numeric)
+            Energy or insolation associated with each target timestamp
+        '''
+
+        dtype = kwargs.pop('dtype', None)
+        if kwargs:
+            raise TypeError('unexpected keyword arguments: ' + ', '.join(kwargs))
+
+        energy = self._integrate(series, dtype)
+        return [pd.Series(energy[:, i], index=self.target_index, name=s.name)
+                for i, s in enumerate(series)]
+
+    def _integrate(self, columns, dtype=None):
+        '''integrate for a sequence of arrays, returning a 2D array with a column for each'''
+
+        # Per point values stay in dtype, only the interval sums accumulate in float64
+        work_dtype = np.float64 if dtype is None else dtype
+
+        if self.downsample:
+            if self._take is None:
+                return np.zeros((len(self.target_index), len(columns)), dtype=work_dtype)
+            values = np.empty((self._block.stop - self._block.start, len(columns)),
+                              dtype=work_dtype)
+            for i, column in enumerate(columns):
+                column = np.asarray(column)
+                if self._order is not None:
+                    column = column[self._order]
+                values[:, i] = column[self._block]
+            values *= self._source_tds[self._block]
+            np.copyto(values, 0, where=np.isnan(values))
+            return self._interval_sums(values)[self._take]
+
+        values = np.column_stack([np.asarray(column, dtype=work_dtype) for column in columns])
+        if self._order is not None:
+            values = values[self._order]
+        energy = self._interpolate(values)
+        energy *= self._target_tds
+        return energy
+
+    def _interval_sums(self, values, block_rows=2**16):
+        '''
+        Sums of the model values in each target interval, accumulated in
+        float64 over blocks of rows so that only one block is cast at a time
+        '''
+        sums = np.zeros((len(self.target_index), values.shape[1]), dtype=values.dtype)
+        carry = None
+        for start in range(0, len(values), block_rows):
+            stop = min(start + block_rows, len(values))
+            # The populated intervals starting in the block, and the one it starts in
+            first = np.searchsorted(self._starts, start, side='right') - 1
+            last = np.searchsorted(self._starts, stop, side='left')
+            offsets = self._starts[first:last] - start
+            offsets[0] = 0
+            partial = np.add.reduceat(values[start:stop].astype(np.float64), offsets, axis=0)
+            intervals = self._populated[first:last]
+
+            # An interval continuing from the previous block adds its partial sum
+            if carry is not None:
+                if carry[0] == intervals[0]:
+                    partial[0] += carry[1]
+                else:
+                    sums[carry[0]] = carry[1]
+            sums[intervals[:-1]] = partial[:-1]
+            carry = (intervals[-1], partial[-1])
+
+        if carry is not None:
+            sums[carry[0]] = carry[1]
+        return sums
+
+    def _interpolate(self, values):
+        lower = values[self._lower]
+        upper = values[self._upper]
+        weight = self._weight.astype(values.dtype, copy=False)
+        step = upper - lower
+        power = np.where(weight < 0.5, lower + step * weight, upper - step * (1 - weight))
+
+        # Missing model values are interpolated over, and energy timestamps
+        # before the first valid model value get NaN
+        target = self.target_index.asi8
+        for i in np.flatnonzero(np.isnan(values).any(axis=0)):
+            valid = ~np.isnan(values[:, i])
+            if not valid.any():
+                power[:, i] = np.nan
+                continue
+            left = values[0, i] if valid[0] else np.nan
+            power[:, i] = np.interp(target, self._source[valid], values[valid, i], left=left)
+        return power
+
+
+def _as_index(times, freq=None):
+    '''A DatetimeIndex view of an array of int64 nanosecond timestamps, with frequency freq'''
+    if isinstance(times, pd.DatetimeIndex):
+        return times
+    return pd.DatetimeIndex(np.asarray(times, dtype=np.int64).view('datetime64[ns]'), freq=freq)
+
+
+def _same_times(index, times):
+    '''Returns True if times is index, or its int64 nanosecond timestamps'''
+    if index is times:
+        return True
+    if isinstance(times, pd.DatetimeIndex):
+        return index.equals(times)
+    return np.array_equal(index.asi8, times)
+
+
+def _right_closed(freq):
+    '''Returns True if pandas resamples freq with right closed, right labeled bins'''
+    end_types = ('M', 'A', 'Q', 'BM', 'BA', 'BQ', 'W', 'ME', 'Y', 'YE', 'QE', 'BME', 'BY',
+                 'BYE', 'BQE')
+    return freq.rule_code.split('-')[0] in end_types
+
+
+def _model_energy(energy, dc_power, irrad, mapping=None, dtype=None):
+    '''
+    Returns (energy_dc, insolation), modeled energy and insolation aligned with
+    energy, using mapping when given and with dtype when given
+    '''
+
+    if mapping is None:
+        freq = check_series_frequency(energy, 'energy')
+        mapping = ResampleMapping(dc_power.index, energy.index, freq)
+    elif not mapping.matches(dc_power.index, energy.index):
+        raise ValueError('mapping was not computed for the model and energy time indexes')
+
+    if irrad.index.equals(dc_power.index):
+        energy_dc, insolation = mapping.integrate(dc_power, irrad, dtype=dtype)
+    else:
+        energy_dc, = mapping.integrate(dc_power, dtype=dtype)
+        irrad_mapping = ResampleMapping(irrad.index, energy.index, mapping.freq,
+                                        downsample=mapping.downsample)
+        insolation, = irrad_mapping.integrate(irrad, dtype=dtype)
+
+    return energy_dc, insolation
+
+
+def normalize_with_pvwatts_chunked(chunks, downsample=None):
+    '''
+    Streaming form of normalize_with_pvwatts for data too large to hold in
+    memory at once. Chunks are normalized as they are consumed, with the
+    interval lengths and interpolation carried across chunk edges, so that
+    the concatenated output matches normalize_with_pvwatts on the full data.
+
+    Parameters
+    ----------
+    chunks: iterable of tuples (energy, pvwatts_kws)
+        Consecutive, non-overlapping pieces of the energy time series and the
+        PVWatts parameters for the same period, e.g. one month each, in time
+        order. See normalize_with_pvwatts for the contents of pvwatts_kws.
+        poa_global and T_cell must share the same index within a chunk.
+    downsample: bool, default None
+        Whether to sum modeled energy into the energy intervals (True) or to
+        interpolate modeled power (False), see ResampleMapping. Chosen from the
+        mean time step sizes of the first chunk if omitted.
+
+    Returns
+    -------
+    generator of tuples (normalized_energy, insolation)
+        normalized_energy: Pandas Series (numeric)
+            Energy divided by PVWatts DC energy.
+        insolation: Pandas Series (numeric)
+            Insolation associated with each normalized point
+        Points are yielded once later data can no longer change them, so a
+        chunk's results may be yielded together with those of the next chunk.
+    '''
+
+    def _models():
+        for energy, pvwatts_kws in chunks:
+            yield energy, pvwatts_dc_power(**pvwatts_kws), pvwatts_kws['poa_global']
+
+    return _normalize_chunks(_models(), downsample)
+
+
+def normalize_with_sapm_chunked(chunks, downsample=None):
+    '''
+    Streaming form of normalize_with_sapm for data too large to hold in
+    memory at once. Chunks are normalized as they are consumed, with the
+    interval lengths and interpolation carried across chunk edges, so that
+    the concatenated output matches normalize_with_sapm on the full data.
+
+    Parameters
+    ----------
+    chunks: iterable of tuples (energy, sapm_kws)
+        Consecutive, non-overlapping pieces of the energy time series and the
+        SAPM parameters for the same period, e.g. one month of met_data each,
+        in time order. See normalize_with_sapm for the contents of sapm_kws.
+    downsample: bool, default None
+        Whether to sum modeled energy into the energy intervals (True) or to
+        interpolate modeled power (False), see ResampleMapping. Chosen from the
+        mean time step sizes of the first chunk if omitted.
+
+    Returns
+    -------
+    generator of tuples (normalized_energy, insolation)
+        normalized_energy: Pandas Series (numeric)
+            Energy divided by Sandia Model DC energy.
+        insolation: Pandas Series (numeric)
+            Insolation associated with each normalized point
+        Points are yielded once later data can no longer change them, so a
+        chunk's results may be yielded together with those of the next chunk.
+    '''
+
+    def _models():
+        for energy, sapm_kws in chunks:
+            dc_power, irrad = sapm_dc_power(**sapm_kws)
+            yield energy, dc_power, irrad
+
+    return _normalize_chunks(_models(), downsample)
+
+
+def _normalize_chunks(chunks, downsample=None):
+    '''
+    Generator of (normalized_energy, insolation) for an iterable of
+    (energy, dc_power, irrad) chunks, holding back the points that depend on
+    data from later chunks
+    '''
+
+    freq = None
+    energy = None  # energy not yet yielded, with its interval lengths
+    model = None  # model data that may still contribute to energy not yet yielded
+
+    for energy_chunk, dc_power, irrad in chunks:
+        if not irrad.index.equals(dc_power.index):
+            raise ValueError('chunked normalization requires modeled power and irradiance '
+                             'on the same index')
+        if freq is None:
+            freq = pd.tseries.frequencies.to_offset(
+                check_series_frequency(energy_chunk, 'energy'))
+
+        energy = _append_chunk(energy, energy_chunk.index, energy_chunk.values)
+        model = _append_chunk(model, dc_power.index,
+                              np.column_stack([np.asarray(dc_power, dtype=float),
+                                               np.asarray(irrad, dtype=float)]))
+        names = (energy_chunk.name, dc_power.name, irrad.name)
+        if energy is None or model is None:
+            continue
+
+        mapping = _chunk_mapping(model, energy, freq, downsample)
+        downsample = mapping.downsample
+        n_final, model_start = _final_points(mapping, model)
+        if n_final:
+            yield _normalize_chunk(mapping, energy, model, names, n_final)
+            energy = _drop_chunk(energy, n_final)
+            model = _drop_chunk(model, model_start)
+
+    if energy is not None and model is not None and len(energy[0]):
+        mapping = _chunk_mapping(model, energy, freq, downsample)
+        yield _normalize_chunk(mapping, energy, model, names, len(energy[0]))
+
+
+def _append_chunk(buffer, index, values):
+    '''
+    Appends a chunk to a buffer tuple (index, values, interval lengths, last
+    timestamp), using the last timestamp for the first interval length of the
+    chunk
+    '''
+
+    tds = _delta_hours(index)
+    if not len(index):
+        return buffer
+    if buffer is None:
+        return index, values, tds, index.asi8[-1]
+
+    buffer_index, buffer_values, buffer_tds, last = buffer
+    if index.asi8[0] <= last:
+        raise ValueError('chunks must be consecutive and in time order')
+    tds[0] = (index.asi8[0] - last) / (10.0**9 * 3600.0)
+    return (buffer_index.append(index), np.concatenate([buffer_values, values]),
+            np.concatenate([buffer_tds, tds]), index.asi8[-1])
+
+
+def _drop_chunk(buffer, n):
+    '''Drops the first n points of a buffer tuple'''
+    index, values, tds, last = buffer
+    return index[n:], values[n:], tds[n:], last
+
+
+def _chunk_mapping(model, energy, freq, downsample):
+    '''ResampleMapping of the buffered data, with the carried interval lengths'''
+    mapping = ResampleMapping(model[0], energy[0], freq, downsample)
+    mapping._source_tds = model[2][:, np.newaxis]
+    mapping._target_tds = energy[2][:, np.newaxis]
+    return mapping
+
+
+def _final_points(mapping, model):
+    '''
+    Returns (number of buffered energy points that later chunks cannot change,
+    first buffered model point still needed afterwards)
+    '''
+
+    target = mapping.target_index.asi8
+    if mapping.downsample:
+        # Later model data can only add to intervals after the last populated
+        # one, and decides whether empty intervals before it stay empty
+        populated = np.flatnonzero(~mapping._empty)
+        if not len(populated):
+            return 0, 0
+        n_final = populated[-1]
+        return n_final, mapping._block.start + mapping._offsets[n_final]
+
+    # Interpolated points are fixed once every model series has a valid value
+    # after them, and later points need the last valid values before them
+    source = model[0].asi8
+    valid = ~np.isnan(model[1])
+    if not valid.any(axis=0).all():
+        return 0, 0
+    last_valid = np.array([source[np.flatnonzero(column)[-1]] for column in valid.T])
+    n_final = np.searchsorted(target, last_valid.min(), side='right')
+    if not n_final:
+        return 0, 0
+    before = np.searchsorted(source, target[n_final - 1], side='right')
+    model_start = before
+    for column in valid[:before].T:
+        previous = np.flatnonzero(column)
+        model_start = min(model_start, previous[-1] if len(previous) else max(before - 1, 0))
+    return n_final, model_start
+
+
+def _normalize_chunk(mapping, energy, model, names, n_final):
+    '''Normalized energy and insolation of the first n_final buffered energy points'''
+
+    index, values = model[0], model[1]
+    energy_dc, insolation = mapping.integrate(pd.Series(values[:, 0], index=index, name=names[1]),
+                                              pd.Series(values[:, 1], index=index, name=names[2]))
+    energy_series = pd.Series(energy[1][:n_final], index=energy[0][:n_final], name=names[0])
+    return energy_series / energy_dc[:n_final], insolation[:n_final]
 
 
 def delta_index(series):
@@ -272,21 +1089,36 @@ def delta_index(series):
     returns (time step sizes, average time step size) in hours
     '''
 
+    deltas = _delta_hours(series.index)
+    mean_delta = np.mean(deltas[~np.isnan(deltas)])
     if series.index.freq is None:
-        # If there is no frequency information, explicily calculate interval sizes
-        # Length of each interval calculated by using 'int64' to convert to nanoseconds
-        hours = pd.Series(series.index.astype('int64') / (10.0**9 * 3600.0))
-        hours.index = series.index
-        deltas = hours.diff()
+        deltas = pd.Series(deltas, index=series.index)
     else:
-        # If there is frequency information, pandas shift can be used to gain a meaningful
-        # interful for the first element of the timeseries
-        # Length of each interval calculated by using 'int64' to convert to nanoseconds
-        deltas = (series.index - series.index.shift(-1)).astype('int64') / (10.0**9 * 3600.0)
-    return deltas, np.mean(deltas.dropna())
+        deltas = pd.Index(deltas)
+    return deltas, mean_delta
+
+
+def _delta_hours(index):
+    '''
+    Returns the time step sizes of a DatetimeIndex in hours as a numpy array.
+    The first step is NaN unless the index has frequency information.
+    '''
+
+    # Length of each interval calculated from the 'int64' nanosecond timestamps
+    nanoseconds = index.asi8
+    deltas = np.empty(len(nanoseconds))
+    if len(nanoseconds):
+        if index.freq is None:
+            deltas[0] = np.nan
+        else:
+            # If there is frequency information, pandas shift can be used to gain a
+            # meaningful interval for the first element of the timeseries
+            deltas[0] = (index[0] - index[:1].shift(-1)[0]).value
+        deltas[1:] = np.diff(nanoseconds)
+    return deltas / (10.0**9 * 3600.0)
 
 
-def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None):
+def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None, return_info=False):
     '''
     Attempts to rescale modeled irradiance to match measured irradiance on clear days
     Parameters
@@ -301,12 +1133,20 @@ def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None):
     method: (str)
         The caclulation method to use. 'single_opt' implements the irradiance_rescale of
         rdtools v1.1.3 and earlier. 'iterative' implements a more stable calculation
-        that may yield different results from the single_opt method. Default None issues
-        a warning then uses the iterative calculation.
+        that may yield different results from the single_opt method. 'closed_form'
+        runs the same iteration as 'iterative' but solves each rescale exactly as
+        sum(modeled * measured) / sum(modeled**2) over the clear sky filter
+        instead of with Nelder-Mead, which is much faster and may differ from
+        'iterative' by the optimizer tolerance. Default None issues a warning then
+        uses the iterative calculation.
+    return_info: (bool)
+        If True, also return a dict with the rescale factor ('factor') and the
+        number of filter updates performed ('iterations'), default False.
 
     Returns
     -------
     Pandas Series (numeric): resacaled modeled irradaince time series
+    dict: only if return_info is True
     '''
 
     if method is None:
@@ -316,22 +1156,40 @@ def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None):
         method = 'iterative'
 
     if method == 'iterative':
-        def _rmse(fact):
-            "Calculates RMSE with a given rescale fact(or) according to global filt(er)"
+        def _rmse(fact, filt):
+            "Calculates RMSE with a given rescale fact(or) according to filt(er)"
             rescaled_modeled_irrad = fact * modeled_irrad
             rmse = np.sqrt(((rescaled_modeled_irrad[filt] - irrad[filt]) ** 2.0).mean())
             return rmse
 
         def _single_rescale(irrad, modeled_irrad, guess):
             "Optimizes rescale factor once"
-            global filt
+            # The filter is passed to the objective rather than shared through
+            # module state, so concurrent rescales do not interfere
             csi = irrad / (guess * modeled_irrad)  # clear sky index
             filt = (csi >= 0.8) & (csi <= 1.2) & (irrad > 200)
-            min_result = minimize(_rmse, guess, method='Nelder-Mead')
+            min_result = minimize(_rmse, guess, args=(filt,), method='Nelder-Mead')
 
             factor = min_result['x'][0]
             return factor
 
+    elif method == 'closed_form':
+        irrad_aligned, modeled_aligned = irrad.align(modeled_irrad)
+        irrad_values = irrad_aligned.values.astype(float)
+        modeled_values = modeled_aligned.values.astype(float)
+
+        def _single_rescale(irrad, modeled_irrad, guess):
+            "Solves for the rescale factor that minimizes RMSE over the clear sky filter"
+            with np.errstate(divide='ignore', invalid='ignore'):
+                csi = irrad_values / (guess * modeled_values)  # clear sky index
+            filt = (csi >= 0.8) & (csi <= 1.2) & (irrad_values > 200)
+            if not filt.any():
+                return guess
+            filtered_modeled = modeled_values[filt]
+            return (np.dot(filtered_modeled, irrad_values[filt]) /
+                    np.dot(filtered_modeled, filtered_modeled))
+
+    if method in ('iterative', 'closed_form'):
         # Calculate an initial guess for the rescale factor
         factor = np.percentile(irrad.dropna(), 90) / np.percentile(modeled_irrad.dropna(), 90)
 
@@ -347,7 +1205,8 @@ def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None):
         if delta >= convergence_threshold:
             raise ConvergenceError('Rescale did not converge within max_iterations')
         else:
-            return factor * modeled_irrad
+            out_irrad = factor * modeled_irrad
+            info = {'factor': factor, 'iterations': i + 1}
 
     elif method == 'single_opt':
         def _rmse(fact):
@@ -362,22 +1221,167 @@ def irradiance_rescale(irrad, modeled_irrad, max_iterations=100, method=None):
         factor = min_result['x'][0]
 
         out_irrad = factor * modeled_irrad
-        return out_irrad
+        info = {'factor': factor, 'iterations': 1}
 
     else:
         raise ValueError('Invalid method')
 
+    if return_info:
+        return out_irrad, info
+    return out_irrad
+
+
+def irradiance_rescale_fleet(irrad, modeled_irrad, max_iterations=100):
+    '''
+    Rescales modeled irradiance to match measured irradiance on clear days for
+    many sensors at once, using the 'closed_form' method of irradiance_rescale
+    on all columns together. Columns leave the iteration as they converge.
+
+    Parameters
+    ----------
+    irrad: Pandas DataFrame (numeric)
+        measured irradiance time series, one column per sensor
+    modeled_irrad: Pandas DataFrame (numeric)
+        modeled irradiance time series with the same columns as irrad
+    max_iterations: (int)
+        The maximum number of times to attempt rescale optimization, default 100.
+
+    Returns
+    -------
+    tuple (rescaled, report)
+        rescaled: Pandas DataFrame (numeric)
+            rescaled modeled irradiance, NaN for columns that did not converge
+        report: Pandas DataFrame indexed by column with the rescale factor
+            ('factor'), the number of filter updates ('iterations'), whether
+            the rescale converged ('converged') and the ConvergenceError of
+            columns that did not converge, None otherwise ('error')
+    '''
+
+    irrad, modeled_irrad = irrad.align(modeled_irrad)
+    irrad_values = irrad.values.astype(float)
+    modeled_values = modeled_irrad.values.astype(float)
+    n_columns = irrad_values.shape[1]
+
+    # Calculate an initial guess for the rescale factor
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        factor = (np.nanpercentile(irrad_values, 90, axis=0) /
+                  np.nanpercentile(modeled_values, 90, axis=0))
+
+    iterations = np.zeros(n_columns, dtype=int)
+    converged = np.zeros(n_columns, dtype=bool)
+
+    # Only points with measured irradiance above 200 can pass the clear sky
+    # filter, and the products summed by the solution do not change. Each
+    # sensor is stored as a contiguous row so active sensors are cheap to take.
+    with np.errstate(invalid='ignore'):
+        bright = irrad_values > 200
+    rows = bright.any(axis=1)
+    irrad_values = np.ascontiguousarray(np.where(bright, irrad_values, np.nan)[rows].T)
+    modeled_values = np.ascontiguousarray(modeled_values[rows].T)
+    with np.errstate(invalid='ignore'):
+        products = np.nan_to_num(irrad_values * modeled_values)
+        squares = np.nan_to_num(modeled_values ** 2)
+
+    # Iteratively solve the rescale of the active columns, recalculating the
+    # clear sky filter each time. Columns without an initial guess cannot converge.
+    convergence_threshold = 10**-6
+    active = np.flatnonzero(np.isfinite(factor))
+    for i in range(max_iterations):
+        if not len(active):
+            break
+        prev_factor = factor[active]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            csi = irrad_values[active] / (prev_factor[:, None] * modeled_values[active])
+            filt = (csi >= 0.8) & (csi <= 1.2)
+        numerator = np.einsum('ij,ij->i', filt, products[active])
+        denominator = np.einsum('ij,ij->i', filt, squares[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            new_factor = np.where(filt.any(axis=1), numerator / denominator, prev_factor)
+
+        factor[active] = new_factor
+        iterations[active] = i + 1
+        done = abs(new_factor - prev_factor) < convergence_threshold
+        converged[active[done]] = True
+        active = active[~done]
+
+    errors = [None if ok else ConvergenceError('Rescale did not converge within max_iterations')
+              for ok in converged]
+    report = pd.DataFrame({'factor': factor, 'iterations': iterations,
+                           'converged': converged, 'error': errors},
+                          index=irrad.columns, columns=['factor', 'iterations', 'converged', 'error'])
+
+    rescaled = modeled_irrad * np.where(converged, factor, np.nan)
+
+    return rescaled, report
+
 
 def check_series_frequency(series, series_description):
     '''Returns the inferred frequency of a pandas series, raises ValueError
     using series_description if it can't. series_description should be a string'''
 
-    if series.index.freq is None:
-        freq = pd.infer_freq(series.index)
-        if freq is None:
-            error_string = ('Could not infer frequency of ' + series_description +
-                            ', which must be a regular time series')
-            raise ValueError(error_string)
-    else:
-        freq = series.index.freq
+    return _index_frequency(series.index, series_description)
+
+
+def _index_frequency(index, description):
+    '''check_series_frequency for a DatetimeIndex, using the frequency cache if enabled'''
+
+    if index.freq is not None:
+        return index.freq
+
+    key = None
+    if _frequency_cache is not None and len(index):
+        nanoseconds = index.asi8
+        key = (nanoseconds[0], nanoseconds[-1], len(nanoseconds), str(index.tz))
+        with _frequency_cache_lock:
+            freq = _frequency_cache.get(key)
+            if freq is not None:
+                _frequency_cache[key] = _frequency_cache.pop(key)
+                return freq
+
+    freq = pd.infer_freq(index)
+    if freq is None:
+        error_string = ('Could not infer frequency of ' + description +
+                        ', which must be a regular time series')
+        raise ValueError(error_string)
+
+    if key is not None:
+        with _frequency_cache_lock:
+            if _frequency_cache is not None:
+                _frequency_cache[key] = freq
+                while len(_frequency_cache) > _frequency_cache_size:
+                    _frequency_cache.popitem(last=False)
     return freq
+
+
+def set_frequency_cache(maxsize=128):
+    '''
+    Enables or disables a least recently used cache of the frequencies
+    inferred by check_series_frequency, so that repeated normalizations over
+    the same time index skip frequency inference.
+
+    The cache is keyed by the first and last timestamps, length and time zone
+    of an index. A different index matching a cached one on these properties
+    is assumed to have the same frequency, so only enable the cache when such
+    indexes are known to share the same spacing.
+
+    Parameters
+    ----------
+    maxsize: int, default 128
+        Maximum number of cached frequencies. 0 or None disables and clears
+        the cache.
+    '''
+
+    global _frequency_cache, _frequency_cache_size
+
+    with _frequency_cache_lock:
+        if not maxsize:
+            _frequency_cache = None
+            _frequency_cache_size = 0
+            return
+        if _frequency_cache is None:
+            _frequency_cache = OrderedDict()
+        _frequency_cache_size = maxsize
+        while len(_frequency_cache) > maxsize:
+            _frequency_cache.popitem(last=False)
@@ -1,8 +1,14 @@
 import unittest
 import pandas as pd
+import numpy as np
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 from rdtools.clearsky_temperature import get_clearsky_tamb
+from rdtools.clearsky_temperature import get_clearsky_tamb_fleet
+from rdtools.clearsky_temperature import close_temperature_dataset
+from rdtools.clearsky_temperature import set_clearsky_tamb_cache
+from rdtools import clearsky_temperature
 
 
 class ClearSkyTemperatureTestCase(unittest.TestCase):
@@ -36,6 +42,91 @@ class ClearSkyTemperatureTestCase(unittest.TestCase):
         self.assertTrue(east_hottest_hour > 12)
         self.assertTrue(west_hottest_hour > east_hottest_hour)
 
+    # Test the temperature grids are loaded once, shared and reloaded after closing
+    def test_dataset(self):
+
+        grids = clearsky_temperature._dataset.grids()
+        self.assertIs(clearsky_temperature._dataset.grids(), grids)
+        self.assertFalse(grids[0].flags.writeable)
+
+        close_temperature_dataset()
+        pool = ThreadPool(8)
+        try:
+            loaded = pool.map(lambda i: clearsky_temperature._dataset.grids(), range(8))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertTrue(all(g is loaded[0] for g in loaded))
+        self.assertIsNot(loaded[0], grids)
+
+        dt = self.china_west.index
+        pd.testing.assert_series_equal(get_clearsky_tamb(dt, 37.951721, 80.609843), self.china_west)
+
+    # Test the fleet calculation matches the single site one, with per-site time zones
+    def test_fleet(self):
+
+        dt = self.china_west.index
+        fleet = get_clearsky_tamb_fleet(dt.tz_convert('UTC'), [37.951721, 36.693692, 40.0],
+                                        [80.609843, 117.699686, -105.0],
+                                        timezones=['Asia/Shanghai', 'Asia/Shanghai', 'Etc/GMT+7'])
+        denver = get_clearsky_tamb(dt.tz_convert('Etc/GMT+7'), 40.0, -105.0)
+
+        self.assertEqual(list(fleet.columns), [0, 1, 2])
+        self.assertTrue((fleet.index == dt).all())
+        self.assertTrue((fleet[0].values == self.china_west.values).all())
+        self.assertTrue((fleet[1].values == self.china_east.values).all())
+        self.assertTrue((fleet[2].values == denver.values).all())
+
+        with self.assertRaises(ValueError):
+            get_clearsky_tamb_fleet(dt, [37.951721, 36.693692], [80.609843])
+
+    # Test sites on pixels without data use the gap-filled grids
+    def test_missing_pixels(self):
+
+        day, night = clearsky_temperature._dataset.grids()
+        self.assertFalse(np.isnan(day).any())
+        self.assertFalse(np.isnan(night).any())
+
+        # Pacific Ocean and the antimeridian, at the edge of the grid
+        dt = self.china_west.index.tz_convert('Etc/GMT-12')
+        for latitude, longitude in [(13.85, 153.21), (0.0, 179.9)]:
+            tamb = get_clearsky_tamb(dt, latitude, longitude)
+            self.assertEqual(len(tamb), len(dt))
+            self.assertFalse(tamb.isnull().any())
+
+    # Test the smoothed daily temperatures are cached per site and reused for other times
+    def test_cache(self):
+
+        dt = self.china_west.index
+        set_clearsky_tamb_cache(0)
+        try:
+            uncached = get_clearsky_tamb(dt[100:2000], 37.951721, 80.609843)
+            self.assertEqual(len(clearsky_temperature._climatology_cache), 0)
+
+            set_clearsky_tamb_cache(2)
+            get_clearsky_tamb(dt, 37.951721, 80.609843)
+            cached = get_clearsky_tamb(dt[100:2000], 37.951721, 80.609843)
+            pd.testing.assert_series_equal(cached, uncached)
+            get_clearsky_tamb(dt, 36.693692, 117.699686)
+            get_clearsky_tamb(dt, 40.0, -105.0)
+            self.assertEqual(len(clearsky_temperature._climatology_cache), 2)
+        finally:
+            set_clearsky_tamb_cache()
+
+        # Times without a regular frequency
+        pd.testing.assert_series_equal(get_clearsky_tamb(dt[[0, 5, 7, 500]], 37.951721, 80.609843),
+                                       self.china_west.iloc[[0, 5, 7, 500]])
+
+    # Test the vectorized UTC offsets across daylight saving time changes
+    def test_utc_offset(self):
+
+        dt = pd.date_range('2015-03-07', '2015-11-03', freq='30min', tz='US/Eastern')
+        expected = [t.utcoffset().total_seconds() / 3600.0 for t in dt]
+        self.assertTrue((clearsky_temperature._utc_offset_hours(dt) == expected).all())
+
+        with self.assertRaises(ValueError):
+            get_clearsky_tamb(dt.tz_localize(None), 40.0, -75.0)
+
 # TODO:
 # Test irradiance_rescale
 
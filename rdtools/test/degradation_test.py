@@ -6,8 +6,12 @@ import sys
 import pandas as pd
 import numpy as np
 import logging
+import json
 
 from rdtools import degradation_ols, degradation_classical_decomposition, degradation_year_on_year
+from rdtools import degradation_ols_fleet, degradation_year_on_year_fleet, YoYAccumulator
+from rdtools import OLSAccumulator
+from rdtools.degradation import _mk_score, _yoy_pairs, _ratio_CI
 
 
 class DegradationTestCase(unittest.TestCase):
@@ -61,10 +65,10 @@ class DegradationTestCase(unittest.TestCase):
 
         '''
         Allowed frequencies for degradation_classical_decomposition
-        in principle CD works on higher frequency data but that makes the
-        tests painfully slow
+        in principle CD works on higher frequency data but minute and
+        second data make the tests slow
         '''
-        cls.list_CD_input_freq = ['MS', 'M', 'W', 'D']
+        cls.list_CD_input_freq = ['MS', 'M', 'W', 'D', 'H']
 
         # Allowed frequencies for degradation_year_on_year
         cls.list_YOY_input_freq = ['MS', 'M', 'W', 'D', 'Irregular_D']
@@ -123,6 +127,154 @@ class DegradationTestCase(unittest.TestCase):
             logging.debug('Actual: {}'.format(100 * self.rd))
             logging.debug('Estimated: {}'.format(rd_result[0]))
 
+    def test_degradation_ols_fleet(self):
+        ''' Test batched ols against ols on each column. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['D']
+        fleet = pd.DataFrame({'a': energy, 'b': 2 * energy, 'c': energy[::-1].values})
+        fleet.iloc[::7, 0] = np.nan
+        # dead channels, without data or with too few points for a covariance
+        fleet['dead'] = np.nan
+        fleet['short'] = np.nan
+        fleet.iloc[:2, 4] = 1.0
+
+        for ci_method in ['delta', 'fieller', 'monte_carlo']:
+            rd, rd_ci, calc_info = degradation_ols_fleet(fleet, ci_method=ci_method, random_state=0)
+            self.assertEqual(rd_ci.shape, (5, 2))
+            self.assertTrue(np.isnan(rd_ci[3:]).all())
+            self.assertTrue(np.isnan(rd[3]))
+
+            for i, column in enumerate(fleet.columns[:3]):
+                if ci_method == 'monte_carlo':
+                    self.assertTrue(rd_ci[i, 0] < rd[i] < rd_ci[i, 1])
+                    continue
+                expected = degradation_ols(fleet[column], ci_method=ci_method)
+                self.assertAlmostEqual(rd[i], expected[0], places=10)
+                np.testing.assert_allclose(rd_ci[i], expected[1], rtol=1e-8)
+                for key in ['slope', 'intercept', 'rmse', 'slope_stderr', 'intercept_stderr']:
+                    self.assertAlmostEqual(calc_info[key][i], expected[2][key], places=10)
+                np.testing.assert_allclose(calc_info['ols_result'][column].params,
+                                           expected[2]['ols_result'].params)
+
+    def test_degradation_year_on_year_fleet(self):
+        ''' Test batched year on year against year on year on each column. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['D']
+        fleet = pd.DataFrame({'a': energy, 'b': 2 * energy, 'c': energy[::-1].values})
+        fleet.iloc[::7, 0] = np.nan
+
+        np.random.seed(0)
+        results = degradation_year_on_year_fleet(fleet)
+        self.assertListEqual(list(results.index), list(fleet.columns))
+
+        np.random.seed(0)
+        for column in fleet.columns:
+            rd, rd_ci, calc_info = degradation_year_on_year(fleet[column])
+            self.assertEqual(results.loc[column, 'Rd_pct'], rd)
+            self.assertEqual(results.loc[column, 'Rd_CI_lower'], rd_ci[0])
+            self.assertEqual(results.loc[column, 'Rd_CI_upper'], rd_ci[1])
+            self.assertEqual(results.loc[column, 'exceedance_level'], calc_info['exceedance_level'])
+            self.assertEqual(results.loc[column, 'renormalizing_factor'],
+                             calc_info['renormalizing_factor'])
+            self.assertEqual(results.loc[column, 'n_pairs'], len(calc_info['YoY_values']))
+
+        # a column without data has NaN results and no pairs
+        fleet['dead'] = np.nan
+        results = degradation_year_on_year_fleet(fleet)
+        self.assertTrue(results.loc['dead', ['Rd_pct', 'Rd_CI_lower', 'Rd_CI_upper']].isnull().all())
+        self.assertEqual(results.loc['dead', 'n_pairs'], 0)
+
+    def test_yoy_pairs_regular(self):
+        ''' Test fast pairing of regular series against merge_asof. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        for freq in ['D', 'W', '3D']:
+            for tz in [None, 'US/Eastern']:
+                index = pd.date_range('2012-02-27', '2017-03-02', freq=freq, tz=tz)
+                partner, time_diff_years = _yoy_pairs(index)
+
+                timestamps = pd.DataFrame({'dt': index, 'position': np.arange(len(index))})
+                timestamps['dt_shifted'] = timestamps.dt + pd.DateOffset(years=1)
+                df = pd.merge_asof(timestamps[['dt']], timestamps,
+                                   left_on='dt', right_on='dt_shifted',
+                                   suffixes=['', '_right'], tolerance=pd.Timedelta('8D'))
+                expected_diff = (df.dt - df.dt_right).astype('timedelta64[h]') / 8760.0
+
+                np.testing.assert_array_equal(partner, df.position.fillna(-1).values)
+                np.testing.assert_array_equal(time_diff_years, expected_diff.values)
+
+    def test_ols_accumulator(self):
+        ''' Test online ols against ols. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['D'].copy()
+        energy.iloc[::9] = np.nan
+        expected = degradation_ols(energy, ci_method='delta')
+
+        accumulator = OLSAccumulator()
+        for timestamp, value in energy.items():
+            accumulator.add(timestamp, value)
+
+        # shards in any order, one restored from persisted state
+        first = OLSAccumulator()
+        first.update(energy.iloc[:400])
+        middle = OLSAccumulator()
+        middle.update(energy.iloc[400:700])
+        middle = OLSAccumulator.from_dict(json.loads(json.dumps(middle.to_dict())))
+        last = OLSAccumulator()
+        last.update(energy.iloc[700:])
+        merged = last.merge(middle).merge(first)
+
+        for acc in [accumulator, merged]:
+            rd, rd_ci, calc_info = acc.confidence_interval()
+            self.assertEqual(acc.n, energy.count())
+            self.assertAlmostEqual(rd, expected[0], places=10)
+            np.testing.assert_allclose(rd_ci, expected[1], rtol=1e-10)
+            for key in ['slope', 'intercept', 'rmse', 'slope_stderr', 'intercept_stderr']:
+                self.assertAlmostEqual(calc_info[key], expected[2][key], places=10)
+
+    def test_yoy_accumulator(self):
+        ''' Test streaming year on year against year on year. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        for input_freq in ['W', 'D', 'Irregular_D']:
+            energy = self.test_corr_energy[input_freq]
+            half = len(energy) // 2
+
+            accumulator = YoYAccumulator()
+            accumulator.update(energy.iloc[:half])
+            # persist state between runs
+            state = json.loads(json.dumps(accumulator.to_dict()))
+            accumulator = YoYAccumulator.from_dict(state)
+            for timestamp, value in energy.iloc[half:].items():
+                accumulator.add(timestamp, value)
+
+            np.random.seed(0)
+            rd, rd_ci, calc_info = accumulator.confidence_interval()
+            np.random.seed(0)
+            expected = degradation_year_on_year(energy)
+
+            self.assertEqual(accumulator.degradation_rate, expected[0])
+            self.assertEqual(rd, expected[0])
+            np.testing.assert_array_equal(rd_ci, expected[1])
+            self.assertEqual(calc_info['exceedance_level'], expected[2]['exceedance_level'])
+            self.assertEqual(accumulator.n_pairs, len(expected[2]['YoY_values']))
+
+        with self.assertRaises(ValueError):
+            accumulator.add(energy.index[0], 1.0)
+
     def test_confidence_intervals(self):
 
         funcName = sys._getframe().f_code.co_name
@@ -153,6 +305,125 @@ class DegradationTestCase(unittest.TestCase):
             # actual rd is within confidence interval
             self.assertTrue(100.0 * self.rd > r2[1][0] and 100.0 * self.rd < r2[1][1])
 
+    def test_classical_decomposition_moving_average(self):
+        ''' Test the centered annual moving average of classical decomposition. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['W']
+        rd_result = degradation_classical_decomposition(energy)
+        series = rd_result[2]['series']
+
+        years = (energy.index - energy.index[0]).days / 365.0
+        for i, y in enumerate(years):
+            if y - 0.5 >= years.min() and y + 0.5 <= years.max():
+                window = energy[(years >= y - 0.5) & (years <= y + 0.5)]
+                self.assertAlmostEqual(series.iloc[i], window.mean(), places=12)
+            else:
+                self.assertTrue(np.isnan(series.iloc[i]))
+
+    def test_bootstrap_memory(self):
+        ''' Test that chunked bootstrap reproduces the unchunked resample. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['D']
+        results = []
+        for bootstrap_memory in [2**40, 2**26, 2**16]:
+            np.random.seed(1)
+            results.append(degradation_year_on_year(energy, bootstrap_memory=bootstrap_memory))
+
+        # bootstrap as originally computed from the full resample matrix
+        yoy = results[0][2]['YoY_values']
+        np.random.seed(1)
+        medians = np.median(np.random.choice(yoy, (len(yoy), 10000), replace=True), axis=0)
+        expected_ci = np.percentile(medians, [50.0 - 68.2 / 2, 50.0 + 68.2 / 2])
+        expected_exceedance = np.percentile(medians, 5)
+
+        for rd, ci, calc_info in results:
+            np.testing.assert_array_equal(ci, expected_ci)
+            self.assertEqual(calc_info['exceedance_level'], expected_exceedance)
+
+    def test_random_state(self):
+        ''' Test seeded confidence intervals are reproducible and independent of workers. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['D']
+
+        for func in [degradation_ols, degradation_classical_decomposition]:
+            r1 = func(energy, random_state=42)
+            r2 = func(energy, random_state=np.random.SeedSequence(42))
+            r3 = func(energy, random_state=43)
+            np.testing.assert_array_equal(r1[1], r2[1])
+            self.assertFalse(np.array_equal(r1[1], r3[1]))
+
+        r1 = degradation_year_on_year(energy, random_state=42)
+        r2 = degradation_year_on_year(energy, random_state=42, workers=4)
+        r3 = degradation_year_on_year(energy, random_state=43)
+        np.testing.assert_array_equal(r1[1], r2[1])
+        self.assertEqual(r1[2]['exceedance_level'], r2[2]['exceedance_level'])
+        self.assertFalse(np.array_equal(r1[1], r3[1]))
+        self.assertTrue(r1[0] > r1[1][0] and r1[0] < r1[1][1])
+
+        # A SeedSequence is not consumed, so the same object gives the same draws
+        seed = np.random.SeedSequence(42)
+        r1 = degradation_year_on_year(energy, random_state=seed)
+        r2 = degradation_year_on_year(energy, random_state=seed)
+        np.testing.assert_array_equal(r1[1], r2[1])
+        fleet = pd.DataFrame({'a': energy, 'b': 2 * energy})
+        pd.testing.assert_frame_equal(degradation_year_on_year_fleet(fleet, random_state=seed),
+                                      degradation_year_on_year_fleet(fleet, random_state=seed))
+        self.assertEqual(seed.n_children_spawned, 0)
+
+    def test_ci_method(self):
+        ''' Test closed form confidence intervals against Monte Carlo. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        energy = self.test_corr_energy['W']
+
+        for func in [degradation_ols, degradation_classical_decomposition]:
+            for confidence_level in [68.2, 95]:
+                mc = func(energy, confidence_level=confidence_level, random_state=0)
+                for ci_method in ['delta', 'fieller']:
+                    r = func(energy, confidence_level=confidence_level, ci_method=ci_method)
+                    self.assertEqual(r[0], mc[0])
+                    self.assertTrue(r[1][0] < r[0] < r[1][1])
+                    # within 5% of the interval width of the Monte Carlo interval
+                    np.testing.assert_allclose(r[1], mc[1], atol=0.05 * (mc[1][1] - mc[1][0]))
+
+            with self.assertRaises(ValueError):
+                func(energy, ci_method='bootstrap')
+
+        # Non-finite estimates give NaN bounds, an insignificant intercept infinite ones
+        for ci_method in ['delta', 'fieller']:
+            ci = _ratio_CI(np.array([np.nan, 1.0]), np.array([np.nan, -0.01]), np.array([np.nan, 1e-6]),
+                           np.array([np.nan, 1e-8]), np.array([np.nan, 0.0]), 68.2, ci_method)
+            self.assertTrue(np.isnan(ci[:, 0]).all())
+            self.assertTrue(np.isfinite(ci[:, 1]).all())
+        ci = _ratio_CI(0.001, -0.01, 1.0, 1e-8, 0.0, 68.2, 'fieller')
+        self.assertEqual(list(ci), [-np.inf, np.inf])
+
+    def test_mk_score(self):
+        ''' Test Mann-Kendall S against the pairwise definition. '''
+
+        funcName = sys._getframe().f_code.co_name
+        logging.debug('Running {}'.format(funcName))
+
+        np.random.seed(0)
+        for n in [0, 1, 2, 7, 16, 101]:
+            # continuous data and data with many ties
+            for x in [np.random.rand(n), np.random.randint(0, 4, n).astype(float)]:
+                expected = 0
+                for k in range(n - 1):
+                    expected += np.sign(x[k + 1:] - x[k]).sum()
+                self.assertEqual(_mk_score(x), expected)
+
 
 if __name__ == '__main__':
     # Initialize logger when run as a module:
@@ -0,0 +1,92 @@
+""" Irradiance Rescale Unit Tests. """
+
+import unittest
+from multiprocessing.pool import ThreadPool
+
+import pandas as pd
+import numpy as np
+
+from rdtools.normalization import irradiance_rescale, irradiance_rescale_fleet
+from rdtools.normalization import ConvergenceError
+
+
+class IrradianceRescaleTestCase(unittest.TestCase):
+    ''' Unit tests for irradiance_rescale. '''
+
+    def setUp(self):
+        np.random.seed(0)
+        index = pd.date_range('2015-01-01', '2015-03-01', freq='15min')
+        hour = index.hour + index.minute / 60.0
+        clear_sky = np.clip(1000 * np.sin((hour - 6) / 12 * np.pi), 0, None)
+
+        # cloudy days scale irradiance randomly, clear days are 7% above model
+        days = np.arange(len(index)) // 96
+        cloudy = np.random.rand(days[-1] + 1)[days] < 0.4
+        cloud_factor = np.where(cloudy, np.random.rand(len(index)), 1.0)
+        noise = 1 + 0.02 * np.random.randn(len(index))
+
+        self.modeled_irrad = pd.Series(clear_sky, index=index)
+        self.irrad = pd.Series(1.07 * clear_sky * cloud_factor * noise, index=index)
+
+    def test_closed_form(self):
+        ''' Test closed form rescale against Nelder-Mead iterative rescale. '''
+
+        iterative, iterative_info = irradiance_rescale(self.irrad, self.modeled_irrad,
+                                                       method='iterative', return_info=True)
+        closed_form, info = irradiance_rescale(self.irrad, self.modeled_irrad,
+                                               method='closed_form', return_info=True)
+
+        self.assertAlmostEqual(info['factor'], 1.07, delta=0.02)
+        self.assertAlmostEqual(info['factor'], iterative_info['factor'], places=4)
+        self.assertTrue(1 <= info['iterations'] <= 100)
+        pd.testing.assert_series_equal(closed_form, info['factor'] * self.modeled_irrad)
+
+    def test_concurrent_rescale(self):
+        ''' Test concurrent rescales of different sites match serial results. '''
+
+        sites = [(self.irrad * (0.9 + 0.005 * i), self.modeled_irrad) for i in range(64)]
+
+        def _rescale(site):
+            return irradiance_rescale(site[0], site[1], method='iterative')
+
+        serial = [_rescale(site) for site in sites]
+
+        pool = ThreadPool(16)
+        try:
+            concurrent = pool.map(_rescale, sites)
+        finally:
+            pool.close()
+            pool.join()
+
+        for expected, result in zip(serial, concurrent):
+            pd.testing.assert_series_equal(result, expected)
+
+    def test_irradiance_rescale_fleet(self):
+        ''' Test batched rescale against per-sensor closed form rescales. '''
+
+        irrad = pd.DataFrame({'sensor_%d' % i: self.irrad * (0.9 + 0.05 * i) for i in range(4)})
+        irrad['broken'] = np.nan
+        modeled_irrad = pd.DataFrame({c: self.modeled_irrad for c in irrad.columns})
+
+        rescaled, report = irradiance_rescale_fleet(irrad, modeled_irrad)
+
+        for column in irrad.columns[:-1]:
+            expected, info = irradiance_rescale(irrad[column], modeled_irrad[column],
+                                                method='closed_form', return_info=True)
+            self.assertAlmostEqual(report.loc[column, 'factor'], info['factor'], places=10)
+            self.assertEqual(report.loc[column, 'iterations'], info['iterations'])
+            self.assertTrue(report.loc[column, 'converged'])
+            self.assertIsNone(report.loc[column, 'error'])
+            pd.testing.assert_series_equal(rescaled[column], expected, check_names=False)
+
+        self.assertFalse(report.loc['broken', 'converged'])
+        self.assertIsInstance(report.loc['broken', 'error'], ConvergenceError)
+        self.assertTrue(rescaled['broken'].isnull().all())
+
+    def test_invalid_method(self):
+        with self.assertRaises(ValueError):
+            irradiance_rescale(self.irrad, self.modeled_irrad, method='newton')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,16 @@ import pandas as pd
 import numpy as np
 
 from rdtools.normalization import normalize_with_pvwatts
+from rdtools.normalization import normalize_with_pvwatts_chunked
+from rdtools.normalization import normalize_with_pvwatts_arrays
 from rdtools.normalization import pvwatts_dc_power
+from rdtools.normalization import ResampleMapping
+from rdtools.normalization import check_series_frequency
+from rdtools.normalization import delta_index
+from rdtools.normalization import set_frequency_cache
+from rdtools.filtering import poa_filter
+from rdtools.aggregation import aggregation_insol
+from rdtools.degradation import degradation_year_on_year
 
 class PVWattsNormalizationTestCase(unittest.TestCase):
     ''' Unit tests for energy normalization module. '''
@@ -98,6 +107,205 @@ class PVWattsNormalizationTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             corr_energy, insolation = normalize_with_pvwatts(self.irregular_timeseries, pvw_kws)
 
+    def test_normalization_with_pvw_arrays(self):
+        ''' Test array PVWatts normalization against the pandas version. '''
+
+        np.random.seed(0)
+        # without frequency information, as for timestamp arrays
+        model_index = pd.DatetimeIndex(list(pd.date_range('2012-01-01', periods=96 * 30,
+                                                          freq='15T')))
+        energy_index = pd.DatetimeIndex(list(pd.date_range('2012-01-01', periods=24 * 30,
+                                                           freq='H')))
+        poa_global = 1000 * np.random.rand(len(model_index))
+        temp = 20 + 10 * np.random.rand(len(model_index))
+        energy = 100 * np.random.rand(len(energy_index))
+        inputs = [poa_global.copy(), temp.copy(), energy.copy()]
+
+        pvw_kws = {'poa_global': pd.Series(poa_global, index=model_index), 'P_ref': 100,
+                   'T_cell': pd.Series(temp, index=model_index), 'gamma_pdc': self.gamma_pdc}
+        expected_energy, expected_insolation = normalize_with_pvwatts(
+            pd.Series(energy, index=energy_index), pvw_kws)
+
+        corr_energy, insolation = normalize_with_pvwatts_arrays(
+            energy_index.asi8, energy, poa_global, 100, T_cell=temp,
+            gamma_pdc=self.gamma_pdc, model_times=model_index.asi8)
+
+        np.testing.assert_allclose(corr_energy, expected_energy.values)
+        np.testing.assert_allclose(insolation, expected_insolation.values)
+        for array, original in zip([poa_global, temp, energy], inputs):
+            np.testing.assert_array_equal(array, original)
+
+        # A mapping computed from the time indexes can be reused for arrays
+        mapping = ResampleMapping(model_index, energy_index)
+        corr_energy, insolation = normalize_with_pvwatts_arrays(
+            energy_index.asi8, energy, poa_global, 100, T_cell=temp,
+            gamma_pdc=self.gamma_pdc, model_times=model_index.asi8, mapping=mapping)
+        np.testing.assert_allclose(corr_energy, expected_energy.values)
+        with self.assertRaises(ValueError):
+            normalize_with_pvwatts_arrays(energy_index.asi8, energy, poa_global, 100,
+                                          mapping=mapping)
+
+        # Frequencies give the first time steps, as for time indexes with frequency information
+        model_index = pd.date_range('2012-01-01', periods=96 * 30, freq='15T')
+        energy_index = pd.date_range('2012-01-01', periods=24 * 30, freq='H')
+        for model_times, model_freq in [(None, None), (model_index, '15T')]:
+            model = energy_index if model_times is None else model_times
+            poa = poa_global[:len(model)]
+            pvw_kws = {'poa_global': pd.Series(poa, index=model), 'P_ref': 100}
+            expected_energy, expected_insolation = normalize_with_pvwatts(
+                pd.Series(energy, index=energy_index), pvw_kws)
+            corr_energy, insolation = normalize_with_pvwatts_arrays(
+                energy_index.asi8, energy, poa, 100, freq='H', model_freq=model_freq,
+                model_times=None if model_times is None else model_times.asi8)
+            self.assertTrue(np.isfinite(corr_energy[0]))
+            np.testing.assert_allclose(corr_energy, expected_energy.values)
+            np.testing.assert_allclose(insolation, expected_insolation.values)
+
+    def test_resample_mapping(self):
+        ''' Test alignment of model data with energy against pandas resampling. '''
+
+        np.random.seed(0)
+        hourly = pd.date_range('2012-01-01', periods=24 * 60, freq='H')
+        quarter_hourly = pd.date_range('2012-01-01', periods=96 * 60, freq='15T')
+
+        for model_index, energy_index in [(quarter_hourly, hourly), (hourly, quarter_hourly)]:
+            poa_global = pd.Series(1000 * np.random.rand(len(model_index)), index=model_index)
+            poa_global.iloc[5:9] = np.nan
+            energy = pd.Series(100 * np.random.rand(len(energy_index)), index=energy_index)
+            pvw_kws = {'poa_global': poa_global, 'P_ref': 100}
+            freq = energy.index.freq
+            hours = freq.nanos / (10.0**9 * 3600.0)
+
+            if len(model_index) > len(energy_index):
+                expected = (poa_global * hours / 4).resample(freq).sum()
+            else:
+                expected = poa_global.resample(freq).asfreq().interpolate() * hours
+            expected = expected.reindex(energy.index, method='nearest')
+
+            mapping = ResampleMapping(model_index, energy_index)
+            if mapping.downsample:
+                # interval sums accumulated over blocks of rows
+                values = np.random.rand(len(model_index), 2)
+                np.testing.assert_allclose(mapping._interval_sums(values, block_rows=7),
+                                           mapping._interval_sums(values), rtol=1e-12)
+            for kws in [{}, {'mapping': mapping}]:
+                corr_energy, insolation = normalize_with_pvwatts(energy, pvw_kws, **kws)
+                pd.testing.assert_series_equal(insolation, expected, check_names=False)
+                pd.testing.assert_series_equal(corr_energy, energy / (expected / 10.0))
+
+            # A mapping for other time indexes is rejected
+            with self.assertRaises(ValueError):
+                normalize_with_pvwatts(energy.iloc[1:], pvw_kws, mapping=mapping)
+
+        # Downsampling onto energy timestamps off the frequency grid sums from each timestamp
+        energy_index = hourly + pd.Timedelta(minutes=30)
+        poa_global = pd.Series(1000 * np.random.rand(len(quarter_hourly)), index=quarter_hourly)
+        energy = pd.Series(100 * np.random.rand(len(energy_index)), index=energy_index)
+        corr_energy, insolation = normalize_with_pvwatts(energy, {'poa_global': poa_global, 'P_ref': 100})
+        expected = (poa_global * 0.25).resample('H', offset='30min').sum()
+        expected = expected.reindex(energy_index, method='nearest')
+        np.testing.assert_allclose(insolation.values, expected.values)
+
+        # Upsampling model timestamps off the energy time index interpolates between them
+        model_index = hourly + pd.Timedelta(minutes=10)
+        poa_global = pd.Series(1000 * np.random.rand(len(model_index)), index=model_index)
+        energy = pd.Series(100 * np.random.rand(len(quarter_hourly)), index=quarter_hourly)
+        corr_energy, insolation = normalize_with_pvwatts(energy, {'poa_global': poa_global, 'P_ref': 100})
+        expected = np.interp(energy.index.asi8, model_index.asi8, poa_global.values) * 0.25
+        np.testing.assert_allclose(insolation.values, expected)
+        self.assertFalse(corr_energy.isnull().any())
+
+    def test_delta_index(self):
+        ''' Test time step sizes with and without frequency information. '''
+
+        deltas, mean_delta = delta_index(self.energy)
+        self.assertEqual(list(deltas[:2]), [31 * 24, 31 * 24])  # first interval from freq
+        self.assertAlmostEqual(mean_delta, 366 * 24 / 12.0)
+
+        deltas, mean_delta = delta_index(self.irregular_timeseries)
+        self.assertTrue(np.isnan(deltas.iloc[0]))
+        np.testing.assert_allclose(deltas.iloc[1:], [5 / 60.0, 1 / 60.0, 3 / 60.0])
+        self.assertAlmostEqual(mean_delta, 3 / 60.0)
+
+    def test_frequency_cache(self):
+        ''' Test inferred frequencies are reused only while the cache is enabled. '''
+
+        energy = pd.Series(self.energy.values, index=pd.DatetimeIndex(list(self.energy.index)))
+        self.assertIsNone(energy.index.freq)
+        set_frequency_cache(2)
+        try:
+            self.assertEqual(check_series_frequency(energy, 'energy'), 'MS')
+            # an index matching on endpoints, length and time zone reuses the cached result
+            shuffled = energy.index[[0, 2, 1] + list(range(3, 12))]
+            self.assertEqual(check_series_frequency(pd.Series(1, index=shuffled), 'energy'), 'MS')
+        finally:
+            set_frequency_cache(0)
+
+        with self.assertRaises(ValueError):
+            check_series_frequency(pd.Series(1, index=shuffled), 'energy')
+
+    def test_normalization_with_pvw_chunked(self):
+        ''' Test chunked PVWatts normalization against in-memory normalization. '''
+
+        np.random.seed(0)
+        hourly = pd.DatetimeIndex(list(pd.date_range('2012-01-01', periods=24 * 90, freq='H')))
+        quarter_hourly = pd.date_range('2012-01-01', periods=96 * 90, freq='15T')
+
+        for model_index, energy_index in [(quarter_hourly, hourly), (hourly, quarter_hourly)]:
+            poa_global = pd.Series(1000 * np.random.rand(len(model_index)), index=model_index)
+            poa_global[np.random.rand(len(model_index)) < 0.05] = np.nan
+            temp = pd.Series(20 + 10 * np.random.rand(len(model_index)), index=model_index)
+            energy = pd.Series(100 * np.random.rand(len(energy_index)), index=energy_index)
+            pvw_kws = {'poa_global': poa_global, 'P_ref': 100, 'T_cell': temp,
+                       'gamma_pdc': self.gamma_pdc}
+            expected_energy, expected_insolation = normalize_with_pvwatts(energy, pvw_kws)
+
+            # monthly chunks, with the model data split a few hours later than energy
+            def chunks():
+                months = energy_index[[0]].append(pd.DatetimeIndex(['2012-02-01', '2012-03-01']))
+                for i, start in enumerate(months):
+                    end = months[i + 1] if i + 1 < len(months) else pd.Timestamp('2013-01-01')
+                    model = slice(start + pd.Timedelta(hours=5) if i else start,
+                                  end + pd.Timedelta(hours=5) - pd.Timedelta(1))
+                    chunk_kws = dict(pvw_kws, poa_global=poa_global[model], T_cell=temp[model])
+                    yield energy[start:end - pd.Timedelta(1)], chunk_kws
+
+            results = list(normalize_with_pvwatts_chunked(chunks()))
+            self.assertTrue(len(results) > 1)
+            corr_energy = pd.concat([r[0] for r in results])
+            insolation = pd.concat([r[1] for r in results])
+            pd.testing.assert_series_equal(corr_energy, expected_energy, check_freq=False)
+            pd.testing.assert_series_equal(insolation, expected_insolation, check_freq=False)
+
+    def test_float32_degradation(self):
+        ''' Test the float32 normalization, filter and aggregation path against float64. '''
+
+        np.random.seed(0)
+        index = pd.date_range('2012-01-01', periods=96 * 365 * 3, freq='15T')
+        hour = index.hour + index.minute / 60.0
+        poa_global = pd.Series(np.clip(1000 * np.sin((hour - 6) / 12 * np.pi), 0, None) *
+                               np.random.uniform(0.5, 1, len(index)), index=index)
+        temp = pd.Series(25 + 15 * np.random.rand(len(index)), index=index)
+        years = (index - index[0]).days / 365.0
+        power = 0.2 * poa_global * (1 - 0.004 * (temp - 25)) * (1 - 0.005 * years)
+        energy = power * 0.25
+        pvw_kws = {'poa_global': poa_global, 'P_ref': 200, 'T_cell': temp,
+                   'gamma_pdc': -0.004}
+
+        degradation_rates = []
+        for dtype in [None, np.float32]:
+            corr_energy, insolation = normalize_with_pvwatts(energy, pvw_kws, dtype=dtype)
+            mask = poa_filter(poa_global)
+            daily = aggregation_insol(corr_energy[mask], insolation[mask], dtype=dtype)
+            if dtype is not None:
+                self.assertEqual(corr_energy.dtype, dtype)
+                self.assertEqual(insolation.dtype, dtype)
+                self.assertEqual(daily.dtype, dtype)
+            degradation_rates.append(degradation_year_on_year(daily)[0])
+
+        self.assertAlmostEqual(degradation_rates[0], -0.5, delta=0.05)
+        self.assertAlmostEqual(degradation_rates[1], degradation_rates[0], delta=0.01)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,13 +1,17 @@
 """ Energy Normalization with SAPM Unit Tests. """
 
 import unittest
+import shutil
+import tempfile
 
 import pandas as pd
 import numpy as np
 import pvlib
 
 from rdtools.normalization import normalize_with_sapm
+from rdtools.normalization import normalize_with_sapm_fleet
 from rdtools.normalization import sapm_dc_power
+from rdtools.normalization import set_solar_position_cache
 
 
 class SapmNormalizationTestCase(unittest.TestCase):
@@ -87,6 +91,73 @@ class SapmNormalizationTestCase(unittest.TestCase):
         self.assertEqual(self.irrad.index.freq, dc_power.index.freq)
         self.assertEqual(len(self.irrad), len(dc_power))
 
+    def test_normalization_with_sapm_fleet(self):
+        ''' Test multi-system SAPM normalization against single systems. '''
+
+        other_module = dict(self.pvsystem.module, A0=0.03)
+        other_module_system = pvlib.pvsystem\
+            .LocalizedPVSystem(location=pvlib.location.Location(latitude=37.88447702,
+                                                                longitude=-122.2652549),
+                               surface_tilt=20,
+                               surface_azimuth=180,
+                               module=other_module,
+                               module_parameters={'pdc0': 2.5, 'gamma_pdc': -0.004},
+                               racking_model='insulated_back_polymerback',
+                               modules_per_string=6)
+        other_tilt_system = pvlib.pvsystem\
+            .LocalizedPVSystem(location=pvlib.location.Location(latitude=37.88447702,
+                                                                longitude=-122.2652549),
+                               surface_tilt=30,
+                               surface_azimuth=180,
+                               module=self.pvsystem.module,
+                               module_parameters={'pdc0': 2.1, 'gamma_pdc': -0.0045},
+                               racking_model='insulated_back_polymerback',
+                               modules_per_string=6)
+        systems = [self.pvsystem, other_module_system, other_tilt_system]
+
+        results = normalize_with_sapm_fleet([self.energy] * 3, systems, self.irrad)
+
+        self.assertEqual(len(results), 3)
+        for pvsystem, (corr_energy, insolation) in zip(systems, results):
+            sapm_kws = {'pvlib_pvsystem': pvsystem, 'met_data': self.irrad}
+            expected_energy, expected_insolation = normalize_with_sapm(self.energy, sapm_kws)
+            pd.testing.assert_series_equal(corr_energy, expected_energy)
+            pd.testing.assert_series_equal(insolation, expected_insolation)
+
+        with self.assertRaises(ValueError):
+            normalize_with_sapm_fleet([self.energy], systems, self.irrad)
+
+    def test_solar_position_cache(self):
+        ''' Test SAPM DC power reuses cached solar positions. '''
+
+        get_solarposition = self.pvsystem.get_solarposition
+        calls = []
+
+        def counted_solarposition(times, *args, **kwargs):
+            calls.append(times)
+            return get_solarposition(times, *args, **kwargs)
+
+        self.pvsystem.get_solarposition = counted_solarposition
+        expected, expected_poa = sapm_dc_power(self.pvsystem, self.irrad)
+
+        directory = tempfile.mkdtemp()
+        try:
+            set_solar_position_cache(directory=directory)
+            for i in range(3):
+                dc_power, poa = sapm_dc_power(self.pvsystem, self.irrad)
+                pd.testing.assert_series_equal(dc_power, expected)
+                pd.testing.assert_series_equal(poa, expected_poa)
+            self.assertEqual(len(calls), 2)
+
+            # a new cache over the same directory loads the stored positions
+            set_solar_position_cache(directory=directory)
+            dc_power, poa = sapm_dc_power(self.pvsystem, self.irrad)
+            pd.testing.assert_series_equal(dc_power, expected)
+            self.assertEqual(len(calls), 2)
+        finally:
+            set_solar_position_cache(0)
+            shutil.rmtree(directory)
+
     def test_normalization_with_sapm(self):
         ''' Test SAPM normalization. '''
 